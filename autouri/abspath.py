@@ -10,6 +10,7 @@ import hashlib
 import logging
 import os
 import shutil
+from concurrent.futures import ThreadPoolExecutor
 from shutil import SameFileError, copyfile
 from typing import Dict, Optional
 
@@ -51,10 +52,11 @@ class AbsPath(URIBase):
             Useful to convert absolute path into URL on a web server.
         MD5_CALC_CHUNK_SIZE:
             Chunk size to calculate md5 hash of a local file.
+            Next chunk is read while hashing a current chunk.
     """
 
     MAP_PATH_TO_URL: Dict[str, str] = dict()
-    MD5_CALC_CHUNK_SIZE: int = 4096
+    MD5_CALC_CHUNK_SIZE: int = 1024 * 1024
 
     _LOC_SUFFIX = ".local"
     _PATH_SEP = os.sep
@@ -109,7 +111,7 @@ class AbsPath(URIBase):
             mt = os.path.getmtime(self._uri)
             sz = os.path.getsize(self._uri)
             if not skip_md5:
-                md5 = self.md5_from_file
+                md5 = self._get_md5_from_file(mtime=mt)
                 if md5 is None:
                     md5 = self.__calc_md5sum()
                 if make_md5_file:
@@ -148,7 +150,7 @@ class AbsPath(URIBase):
 
     def _cp(self, dest_uri):
         """Copy from AbsPath to other classes"""
-        dest_uri = AutoURI(dest_uri)
+        dest_uri = AutoURI(dest_uri, thread_id=self._thread_id)
 
         if isinstance(dest_uri, AbsPath):
             dest_uri.mkdir_dirname()
@@ -225,8 +227,15 @@ class AbsPath(URIBase):
             "calculating md5sum hash of local file: {file}".format(file=self._uri)
         )
         hash_md5 = hashlib.md5()
-        with open(self._uri, "rb") as fp:
-            for chunk in iter(lambda: fp.read(AbsPath.MD5_CALC_CHUNK_SIZE), b""):
+        # read next chunk on a background thread while hashing current one.
+        # both file I/O and hashlib.md5().update() release GIL.
+        with open(self._uri, "rb") as fp, ThreadPoolExecutor(max_workers=1) as ex:
+            future = ex.submit(fp.read, AbsPath.MD5_CALC_CHUNK_SIZE)
+            while True:
+                chunk = future.result()
+                if not chunk:
+                    break
+                future = ex.submit(fp.read, AbsPath.MD5_CALC_CHUNK_SIZE)
                 hash_md5.update(chunk)
 
         logger.debug(
@@ -1,8 +1,11 @@
 import logging
 import multiprocessing
 import os
+import threading
+import time
 import uuid
 from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager
 from typing import Any, Callable, Dict, List, Optional, Tuple, Union
 
@@ -14,12 +17,26 @@ from .metadata import URIMetadata
 logger = logging.getLogger(__name__)
 
 
-def autouri_rm(uri, thread_id, no_lock=False):
+def autouri_rm(uri, thread_id=None, no_lock=False, silent=False):
     """Wrapper for AutoURI(uri).rm().
     This function is used for multiprocessing.map() which requires a picklable function
     outside the scope of the class.
+    It is also used for a thread pool (e.g. GCSURI.rm_batch()).
+    If thread_id is None then use ident of a current (worker) thread
+    so that each worker thread uses its own storage client.
     """
-    AutoURI(uri, thread_id=thread_id).rm(no_lock=no_lock)
+    if thread_id is None:
+        thread_id = threading.get_ident()
+    AutoURI(uri, thread_id=thread_id).rm(no_lock=no_lock, silent=silent)
+
+
+def autouri_read(uri, thread_id=None, byte=False):
+    """Wrapper for AutoURI(uri).read() for a thread pool (e.g. GCSURI.read_batch()).
+    If thread_id is None then use ident of a current (worker) thread.
+    """
+    if thread_id is None:
+        thread_id = threading.get_ident()
+    return AutoURI(uri, thread_id=thread_id).read(byte=byte)
 
 
 class AutoURIRecursionError(RuntimeError):
@@ -45,12 +62,30 @@ class URIBase(ABC):
         LOC_RECURSION_DEPTH_LIMIT:
             Limit depth of recursive localization
             to prevent/detect direct/indirect self referencing.
+        LOC_MAX_WORKERS:
+            Number of threads to localize URIs found in a file
+            during recursive localization. 1 means serial localization.
+            Parallel localization is opt-in (e.g. init_uribase(loc_max_workers=16)).
         LOCK_FILE_EXT:
             Lock file's extention (.lock).
         LOCK_TIMEOUT:
             Lock file timeout (-1 for no timeout).
         LOCK_POLL_INTERVAL:
             Lock file polling interval in seconds.
+        METADATA_CACHE_TTL:
+            Time-to-live of cached metadata in seconds. 0 to disable caching.
+            Only remote URI classes (GCSURI, S3URI and HTTPURL) use the cache.
+            Cached metadata of a URI is invalidated when it is written/removed/copied
+            in the same process. Other processes can see stale metadata up to
+            this TTL so keep it disabled if other processes write on
+            the same files (e.g. lock files).
+            A subclass can override it (e.g. init_gcsuri(metadata_cache_ttl=)).
+        CP_MATCH_CACHE:
+            Remember pairs of source/destination whose md5 hashes are matched in cp()
+            so that md5 hashes are not calculated again for such pair
+            if both have the same mtime and size as before.
+            A file rewritten with the same size within mtime's resolution
+            is not detected so it's disabled by default.
 
     Class constants for subclasses only
         LOC_PREFIX:
@@ -63,9 +98,29 @@ class URIBase(ABC):
             Separator string for directory.
         _SCHEMES:
             Tuple of scheme strings
+        _SCHEME_PREFIXES:
+            Non-empty strings in _SCHEMES.
+            This is automatically set for each subclass on its definition
+            so that it can be directly passed to str.startswith().
         _LOC_SUFFIX:
             Suffix for a localized file
             if file is modified during recursive localization
+        _CACHED_METADATA:
+            Dict of (URI string, (time.monotonic() to expire, URIMetadata))
+            shared by all URI classes.
+            Only metadata of existing URIs is cached.
+            Expired entries are evicted whenever a new entry is cached.
+        _CACHED_METADATA_LOCK:
+            Lock to update/evict entries in _CACHED_METADATA.
+        _CACHED_CP_MATCHES:
+            Dict of ((source URI, destination URI),
+            (source mtime, source size, destination mtime, destination size))
+            for pairs whose md5 hashes are matched in cp().
+            Used only if CP_MATCH_CACHE is True.
+        _CACHED_CP_MATCHES_LOCK:
+            Lock to update/evict entries in _CACHED_CP_MATCHES.
+        _CACHED_CP_MATCHES_MAX_SIZE:
+            Max number of entries in _CACHED_CP_MATCHES.
     """
 
     MD5_FILE_EXT: str = ".md5"
@@ -78,15 +133,28 @@ class URIBase(ABC):
     LOCK_FILE_EXT: str = ".lock"
     LOCK_TIMEOUT: int = 900
     LOCK_POLL_INTERVAL: float = 10.0
+    METADATA_CACHE_TTL: float = 0.0
+    CP_MATCH_CACHE: bool = False
 
     LOC_PREFIX: str = ""
     LOC_RECURSION_DEPTH_LIMIT: int = 10
+    LOC_MAX_WORKERS: int = 1
 
     DEFAULT_NUM_THREADS = 6
 
     _PATH_SEP: str = "/"
     _SCHEMES: Tuple[str, ...] = tuple()
+    _SCHEME_PREFIXES: Tuple[str, ...] = tuple()
     _LOC_SUFFIX: str = ""
+    _CACHED_METADATA = {}
+    _CACHED_METADATA_LOCK = threading.Lock()
+    _CACHED_CP_MATCHES = {}
+    _CACHED_CP_MATCHES_LOCK = threading.Lock()
+    _CACHED_CP_MATCHES_MAX_SIZE = 4096
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._SCHEME_PREFIXES = tuple(s for s in cls._SCHEMES if s)
 
     def __init__(self, uri, thread_id=-1):
         if isinstance(uri, URIBase):
@@ -132,17 +200,22 @@ class URIBase(ABC):
 
     @property
     def uri_wo_scheme(self) -> str:
-        for s in self.__class__.get_schemes():
-            if s and str(self._uri).startswith(s):
-                return str(self._uri).replace(s, "", 1)
-        return str(self._uri)
+        """Memoized on the object along with the URI it is made from."""
+        cached = getattr(self, "_uri_wo_scheme", None)
+        if cached is not None and cached[0] is self._uri:
+            return cached[1]
+        uri = str(self._uri)
+        for s in self.__class__._SCHEME_PREFIXES:
+            if uri.startswith(s):
+                n = len(s)
+                uri = uri[n:]
+                break
+        self._uri_wo_scheme = (self._uri, uri)
+        return uri
 
     @property
     def is_valid(self) -> bool:
-        for s in self.__class__.get_schemes():
-            if s and str(self._uri).startswith(s):
-                return True
-        return False
+        return str(self._uri).startswith(self.__class__._SCHEME_PREFIXES)
 
     @property
     def dirname(self) -> str:
@@ -203,12 +276,19 @@ class URIBase(ABC):
         """Get md5 from a md5 file (.md5) if it exists.
         Check md5 file is newer than the file that it is associated with
         """
+        return self._get_md5_from_file()
+
+    def _get_md5_from_file(self, mtime=None) -> str:
+        """Same as md5_from_file.
+        get_metadata() can pass self's mtime that it already knows
+        to skip another metadata request for it.
+        """
         u_md5 = self.md5_file_uri
         if u_md5.is_valid:
             try:
                 m_md5 = u_md5.get_metadata(skip_md5=True)
                 if m_md5.exists:
-                    self_mtime = self.mtime
+                    self_mtime = self.mtime if mtime is None else mtime
                     logger.debug(
                         "md5 file exists. mt={mt}, md5_mt={md5_mt}, uri={u}".format(
                             mt=self_mtime, md5_mt=m_md5.mtime, u=self._uri
@@ -231,7 +311,55 @@ class URIBase(ABC):
     @property
     def md5_file_uri(self) -> "AutoURI":
         """Get md5 file URI. Not guaranteed to exist"""
-        return AutoURI(str(self._uri) + AutoURI.MD5_FILE_EXT)
+        return AutoURI(str(self._uri) + AutoURI.MD5_FILE_EXT, thread_id=self._thread_id)
+
+    def _get_metadata_from_cache(self, skip_md5=False) -> Optional[URIMetadata]:
+        """Cached metadata if it's not older than METADATA_CACHE_TTL of its class.
+        Cached metadata without md5 is a miss if md5 is required.
+        """
+        if self.__class__.METADATA_CACHE_TTL <= 0:
+            return None
+        cached = URIBase._CACHED_METADATA.get(self._uri)
+        if cached is None:
+            return None
+        expires_at, m = cached
+        if time.monotonic() >= expires_at:
+            return None
+        if not skip_md5 and m.md5 is None:
+            return None
+        return m
+
+    def _update_metadata_cache(self, m: URIMetadata):
+        """Caches metadata of an existing URI and evicts expired entries.
+        An updated entry is moved to the end of dict so that entries are
+        (roughly) ordered by expiration time and expired ones are at the front.
+        """
+        ttl = self.__class__.METADATA_CACHE_TTL
+        if ttl <= 0 or not m.exists:
+            return
+        now = time.monotonic()
+        cache = URIBase._CACHED_METADATA
+        with URIBase._CACHED_METADATA_LOCK:
+            cache.pop(self._uri, None)
+            cache[self._uri] = (now + ttl, m)
+            while cache:
+                oldest = next(iter(cache))
+                if now < cache[oldest][0]:
+                    break
+                del cache[oldest]
+
+    def invalidate_metadata_cache(self):
+        """Removes cached metadata of this URI.
+        Use it to get fresh metadata of a file modified by other processes.
+        """
+        with URIBase._CACHED_METADATA_LOCK:
+            URIBase._CACHED_METADATA.pop(self._uri, None)
+
+    @staticmethod
+    def clear_metadata_cache():
+        """Removes all cached metadata."""
+        with URIBase._CACHED_METADATA_LOCK:
+            URIBase._CACHED_METADATA.clear()
 
     def cp(
         self,
@@ -274,10 +402,13 @@ class URIBase(ABC):
                     2:
                         md5 not found but matched file size and mtime is not newer
         """
-        d = AutoURI(dest_uri)
+        d = AutoURI(dest_uri, thread_id=self._thread_id)
         sep = d.__class__.get_path_sep()
         if d._uri.endswith(sep):
-            d = AutoURI(sep.join([d._uri.rstrip(sep), self.basename]))
+            d = AutoURI(
+                sep.join([d._uri.rstrip(sep), self.basename]),
+                thread_id=self._thread_id,
+            )
 
         logger.info(
             "cp: ({uuid}) started. src={src}, dest={dest}".format(
@@ -287,6 +418,14 @@ class URIBase(ABC):
 
         with d.get_lock(no_lock=no_lock):
             if not no_checksum:
+                if self._is_cp_matched_before(d):
+                    logger.info(
+                        "cp: ({uuid}) skipped due to cached md5_match.".format(
+                            uuid=self.short_uuid
+                        )
+                    )
+                    return (d._uri, 1) if return_flag else d._uri
+
                 # checksum (by md5, size, mdate)
                 m_dest = d.get_metadata(make_md5_file=make_md5_file)
                 logger.debug(
@@ -313,6 +452,7 @@ class URIBase(ABC):
                             "cp: ({uuid}) skipped due to md5_match. "
                             "md5={md5}".format(uuid=self.short_uuid, md5=m_src.md5)
                         )
+                        URIBase._update_cp_match_cache(self, d, m_src, m_dest)
                         return (d._uri, 1) if return_flag else d._uri
 
                     name_matched = self.basename == d.basename
@@ -335,23 +475,73 @@ class URIBase(ABC):
                         )
                         return (d._uri, 2) if return_flag else d._uri
 
-            if not self._cp(dest_uri=d):
-                if not d._cp_from(src_uri=self):
-                    raise Exception("cp: ({uuid}) failed.".format(uuid=self.short_uuid))
+            try:
+                if not self._cp(dest_uri=d):
+                    if not d._cp_from(src_uri=self):
+                        raise Exception(
+                            "cp: ({uuid}) failed.".format(uuid=self.short_uuid)
+                        )
+            finally:
+                d.invalidate_metadata_cache()
 
         logger.info("cp: ({uuid}) done.".format(uuid=self.short_uuid))
         return (d._uri, 0) if return_flag else d._uri
 
+    def _is_cp_matched_before(self, dest_uri: "AutoURI") -> bool:
+        """Checks if md5 hashes of self and dest_uri were matched before
+        in this process and both of them have not changed since then
+        (same mtime and size).
+        This skips calculating md5 hash (e.g. of a large local file) again
+        when same files are localized repeatedly.
+        """
+        if not URIBase.CP_MATCH_CACHE:
+            return False
+        key = (self._uri, dest_uri._uri)
+        cached = URIBase._CACHED_CP_MATCHES.get(key)
+        if cached is None:
+            return False
+        m_src = self.get_metadata(skip_md5=True)
+        m_dest = dest_uri.get_metadata(skip_md5=True)
+        return (
+            m_src.exists
+            and m_dest.exists
+            and cached == (m_src.mtime, m_src.size, m_dest.mtime, m_dest.size)
+        )
+
+    @staticmethod
+    def _update_cp_match_cache(src_uri, dest_uri, m_src, m_dest):
+        """Caches mtime/size of source and destination whose md5 hashes are matched.
+        Entries without mtime cannot be validated later so they are not cached.
+        The oldest entry is evicted if the cache is full.
+        """
+        if not URIBase.CP_MATCH_CACHE:
+            return
+        if m_src.mtime is None or m_dest.mtime is None:
+            return
+        key = (src_uri._uri, dest_uri._uri)
+        cache = URIBase._CACHED_CP_MATCHES
+        with URIBase._CACHED_CP_MATCHES_LOCK:
+            cache.pop(key, None)
+            cache[key] = (m_src.mtime, m_src.size, m_dest.mtime, m_dest.size)
+            while len(cache) > URIBase._CACHED_CP_MATCHES_MAX_SIZE:
+                del cache[next(iter(cache))]
+
     def write(self, s, no_lock=False):
         """Write string/bytes to file. It is protected by a locking mechanism."""
         with self.get_lock(no_lock=no_lock):
-            self._write(s)
+            try:
+                self._write(s)
+            finally:
+                self.invalidate_metadata_cache()
         return
 
     def rm(self, no_lock=False, silent=False):
         """Remove a URI from its storage. It is protected by by a locking mechanism."""
         with self.get_lock(no_lock=no_lock):
-            self._rm()
+            try:
+                self._rm()
+            finally:
+                self.invalidate_metadata_cache()
             if not silent:
                 logger.info(
                     "rm: ({uuid}) {uri}".format(uuid=self.short_uuid, uri=self._uri)
@@ -583,7 +773,8 @@ class URIBase(ABC):
                 and it exists on the same storage so there is no need for localization.
                 In this case, loc_uri will be identical to self._uri.
         """
-        src_uri = AutoURI(src_uri)
+        thread_id = src_uri.thread_id if isinstance(src_uri, URIBase) else -1
+        src_uri = AutoURI(src_uri, thread_id=thread_id)
         if not src_uri.is_valid:
             return (src_uri._uri, False) if return_flag else src_uri._uri
 
@@ -610,9 +801,9 @@ class URIBase(ABC):
         modified = False
         if recursive:
 
-            def fnc_loc(uri):
+            def fnc_loc(uri, thread_id=thread_id):
                 return cls.localize(
-                    uri,
+                    AutoURI(uri, thread_id=thread_id),
                     recursive=recursive,
                     make_md5_file=make_md5_file,
                     loc_prefix=loc_prefix,
@@ -622,21 +813,24 @@ class URIBase(ABC):
                     no_checksum=no_checksum,
                 )
 
-            for ext, fnc_recurse in AutoURI.LOC_RECURSE_EXT_AND_FNC.items():
-                if src_uri.ext == ext:
-                    # read source contents for recursive localization
-                    src_contents = src_uri.read()
-                    maybe_modified_contents, modified = fnc_recurse(
-                        src_contents, fnc_loc
+            fnc_recurse = AutoURI.LOC_RECURSE_EXT_AND_FNC.get(src_uri.ext)
+            if fnc_recurse is not None:
+                # read source contents for recursive localization
+                src_contents = src_uri.read()
+                if AutoURI.LOC_MAX_WORKERS > 1:
+                    fnc_loc = URIBase._localize_in_parallel(
+                        src_contents, fnc_recurse, fnc_loc
                     )
-                    break
+                maybe_modified_contents, modified = fnc_recurse(src_contents, fnc_loc)
 
         if modified:
             # if modified, always suffix basename (before extension) with target storage cls
             basename = src_uri.basename_wo_ext + cls.get_loc_suffix() + src_uri.ext
             dirname = src_uri.loc_dirname
             loc_uri = cls.get_path_sep().join([loc_prefix, dirname, basename])
-            AutoURI(loc_uri).write(maybe_modified_contents, no_lock=no_lock)
+            AutoURI(loc_uri, thread_id=thread_id).write(
+                maybe_modified_contents, no_lock=no_lock
+            )
 
         elif on_different_storage:
             basename = src_uri.basename
@@ -654,14 +848,56 @@ class URIBase(ABC):
 
         return (loc_uri, modified or on_different_storage) if return_flag else loc_uri
 
+    @staticmethod
+    def _localize_in_parallel(
+        contents: str, fnc_recurse: Callable, fnc_loc: Callable
+    ) -> Callable:
+        """Localizes all URIs found in contents with a thread pool.
+        The first recursion only collects valid URIs (without modifying contents)
+        and each unique URI is localized in a worker thread
+        with its own thread_id (for thread-unsafe clients).
+
+        Returns:
+            Callback function for the second recursion.
+            It looks up a localization result for each URI.
+        """
+        # dict as an insertion-ordered set
+        uris = {}
+
+        def fnc_collect(uri):
+            if uri not in uris and AutoURI(uri).is_valid:
+                uris[uri] = None
+            return uri, False
+
+        fnc_recurse(contents, fnc_collect)
+
+        results = {}
+        if uris:
+            num_workers = min(AutoURI.LOC_MAX_WORKERS, len(uris))
+            with ThreadPoolExecutor(max_workers=num_workers) as ex:
+                futures = [
+                    ex.submit(lambda u: fnc_loc(u, threading.get_ident()), uri)
+                    for uri in uris
+                ]
+                for uri, future in zip(uris, futures):
+                    results[uri] = future.result()
+
+        def fnc_lookup(uri):
+            return results.get(uri, (uri, False))
+
+        return fnc_lookup
+
     @staticmethod
     def init_uribase(
         md5_file_ext: Optional[str] = None,
         loc_recurse_ext_and_fnc: Optional[Dict[str, Callable]] = None,
         loc_recursion_depth_limit: Optional[int] = None,
+        loc_max_workers: Optional[int] = None,
         lock_file_ext: Optional[str] = None,
         lock_timeout: Optional[int] = None,
         lock_poll_interval: Optional[float] = None,
+        metadata_cache_ttl: Optional[float] = None,
+        cp_match_cache: Optional[bool] = None,
     ):
         if md5_file_ext is not None:
             URIBase.MD5_FILE_EXT = md5_file_ext
@@ -669,12 +905,21 @@ class URIBase(ABC):
             URIBase.LOC_RECURSE_EXT_AND_FNC = loc_recurse_ext_and_fnc
         if loc_recursion_depth_limit is not None:
             URIBase.LOC_RECURSION_DEPTH_LIMIT = loc_recursion_depth_limit
+        if loc_max_workers is not None:
+            URIBase.LOC_MAX_WORKERS = loc_max_workers
         if lock_file_ext is not None:
             URIBase.LOCK_FILE_EXT = lock_file_ext
         if lock_timeout is not None:
             URIBase.LOCK_TIMEOUT = lock_timeout
         if lock_poll_interval is not None:
             URIBase.LOCK_POLL_INTERVAL = lock_poll_interval
+        if metadata_cache_ttl is not None:
+            URIBase.METADATA_CACHE_TTL = metadata_cache_ttl
+            URIBase.clear_metadata_cache()
+        if cp_match_cache is not None:
+            URIBase.CP_MATCH_CACHE = cp_match_cache
+            with URIBase._CACHED_CP_MATCHES_LOCK:
+                URIBase._CACHED_CP_MATCHES.clear()
 
 
 class AutoURI(URIBase):
@@ -5,27 +5,32 @@
 """
 import logging
 import os
+import shutil
+import threading
 import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, wait
+from contextlib import contextmanager
 from datetime import timedelta
 from subprocess import check_call
-from tempfile import NamedTemporaryFile, TemporaryDirectory
-from typing import Optional, Tuple
+from typing import Any, Dict, List, Optional, Tuple, Union
 
-import requests
+import google.auth
 from filelock import BaseFileLock
 from google.api_core.exceptions import (
     ClientError,
     Forbidden,
     NotFound,
     PermissionDenied,
+    PreconditionFailed,
 )
 from google.auth.exceptions import DefaultCredentialsError
 from google.cloud import storage
-from google.cloud.storage import Blob
+from google.cloud.storage import Blob, Bucket, transfer_manager
 from google.oauth2.service_account import Credentials
 
-from .autouri import AutoURI, URIBase
-from .metadata import URIMetadata, get_seconds_from_epoch, parse_md5_str
+from .autouri import AutoURI, URIBase, autouri_read, autouri_rm
+from .metadata import URIMetadata, parse_md5_str
 from .ntp_now import now_utc
 
 logger = logging.getLogger(__name__)
@@ -62,6 +67,16 @@ def add_google_app_creds_to_env(service_account_key_file):
         )
     )
     os.environ[ENV_VAR_GOOGLE_APPLICATION_CREDENTIALS] = service_account_key_file
+    # resolve default credentials again for new clients
+    GCSURI._CACHED_GCS_CREDENTIALS = None
+
+
+def gcsuri_cp(src_uri, dest_uri, **kwargs):
+    """Wrapper for AutoURI(src_uri).cp(dest_uri) for GCSURI._get_executor().
+    Each worker thread uses its own GCS client (keyed by its thread ident).
+    """
+    thread_id = threading.get_ident()
+    return AutoURI(src_uri, thread_id=thread_id).cp(dest_uri=dest_uri, **kwargs)
 
 
 class GCSURILock(BaseFileLock):
@@ -69,13 +84,24 @@ class GCSURILock(BaseFileLock):
     - LOCK_FILE_EXPIRATION_SEC:
         Expiration of a lock file based on its modtime in seconds
         If expired then such lock file is ignored.
+    - LOCK_OWNER_METADATA_KEY:
+        Key for blob's custom metadata to store id(self) on.
+        Ownership of a lock file can be checked with blob's metadata only
+        without downloading its contents.
     """
 
     LOCK_FILE_EXPIRATION_SEC = 1800
+    LOCK_OWNER_METADATA_KEY = "owner"
 
-    def __init__(self, lock_file, timeout=900, poll_interval=10.0, no_lock=False):
+    def __init__(
+        self, lock_file, timeout=900, poll_interval=10.0, no_lock=False, thread_id=-1
+    ):
+        """thread_id is passed to a lock file's URI
+        so that it's accessed with a client of the thread owning this lock.
+        """
         super().__init__(lock_file, timeout=timeout)
         self._poll_interval = poll_interval
+        self._thread_id = thread_id
         self._lock_read_delay = self._poll_interval / 10.0
 
     def acquire(self, timeout=None, poll_interval=5.0):
@@ -85,31 +111,55 @@ class GCSURILock(BaseFileLock):
     def _acquire(self):
         """Unlike GCSURI, this module does not use S3 Object locking.
         This will write id(self) on a .lock file.
+        id(self) is also written on blob's custom metadata so that
+        ownership can be checked with a metadata-only request.
+
+        A lock file is written with a generation precondition so that
+        only one of competing writers can succeed (others get PreconditionFailed):
+            if_generation_match=0: lock file must not exist.
+            if_generation_match=generation: expired lock file must not have been
+                taken over by another writer since it was read.
         """
-        u = GCSURI(self.lock_file)
+        u = GCSURI(self.lock_file, thread_id=self._thread_id)
         str_id = str(id(self))
         try:
-            if (
-                not u.exists
-                or now_utc().timestamp() > u.mtime + GCSURILock.LOCK_FILE_EXPIRATION_SEC
+            # Bucket.get_blob() returns None if a lock file does not exist
+            # whereas GCSURI.get_blob() raises ValueError.
+            bucket, path = u.get_bucket_path()
+            blob = GCSURI._get_bucket(u._thread_id, bucket).get_blob(path)
+            if blob is None:
+                generation = 0
+            elif (
+                now_utc().timestamp()
+                > blob.updated.timestamp() + GCSURILock.LOCK_FILE_EXPIRATION_SEC
             ):
-                u.write(str_id, no_lock=True)
-                self._context.lock_file_fd = id(self)
+                generation = blob.generation
+            else:
+                if (blob.metadata or {}).get(
+                    GCSURILock.LOCK_OWNER_METADATA_KEY
+                ) == str_id:
+                    self._context.lock_file_fd = id(self)
+                return None
 
-            elif u.read() == str_id:
-                self._context.lock_file_fd = id(self)
+            blob, _ = u.get_blob(new=True)
+            blob.metadata = {GCSURILock.LOCK_OWNER_METADATA_KEY: str_id}
+            blob.upload_from_string(str_id, if_generation_match=generation)
+            self._context.lock_file_fd = id(self)
 
         except Forbidden:
             raise
+        except PreconditionFailed:
+            # another writer has taken the lock file first
+            pass
         except (NotFound, ClientError, ValueError):
             pass
-        except TypeError:
-            # this happens if file exists and failed to get metadata, so u.mtime is None
+        except (AttributeError, TypeError):
+            # this happens if file exists and failed to get metadata (updated)
             pass
         return None
 
     def _release(self):
-        u = GCSURI(self.lock_file)
+        u = GCSURI(self.lock_file, thread_id=self._thread_id)
         try:
             u.rm(no_lock=True, silent=True)
             self._context.lock_file_fd = None
@@ -131,8 +181,27 @@ class GCSURI(URIBase):
             Number of retrial to access a bucket.
         RETRY_BUCKET_DELAY:
             Delay for each retrial in seconds.
+        MAX_BATCH_SIZE:
+            Maximum number of requests in a GCS JSON API batch request.
+        MAX_CONCURRENCY:
+            Number of worker threads for cp_batch() and rm_batch().
+        METADATA_CACHE_TTL (inherited):
+            Time-to-live of cached metadata in seconds. See URIBase for details.
+            init_gcsuri(metadata_cache_ttl=) sets it for GCSURI only.
+        PARALLEL_UPLOAD_THRESHOLD:
+            A local file larger than this (in bytes) is uploaded as
+            chunks of PARALLEL_UPLOAD_CHUNK_SIZE in parallel
+            (MAX_CONCURRENCY threads) with XML API multipart upload.
+            0 to disable it.
+            WARNING:
+                An object uploaded in this way does not have md5 hash
+                so that md5 is taken from md5 file (.md5) only.
+        PARALLEL_UPLOAD_CHUNK_SIZE:
+            Chunk size in bytes for parallel upload.
         USE_GSUTIL_FOR_S3 (experimental):
             This is only for direct transfer between S3 and GCS buckets.
+            Otherwise, data is streamed in-process between S3 and GCS
+            without a local temporary file.
             WARNING:
                 gsutil must be configured correctly to have all
                 AWS credentials in ~/.boto file.
@@ -143,8 +212,27 @@ class GCSURI(URIBase):
         _CACHED_GCS_CLIENTS:
             Per-thread GCS client object is required since
             GCS client is not thread-safe.
+        _CACHED_GCS_CREDENTIALS:
+            Tuple of (default credentials, project) shared by per-thread clients.
+        _CACHED_GCS_BUCKETS:
+            Bucket objects cached per (thread_id, bucket, anonymous).
         _CACHED_PRESIGNED_URLS:
-            Can use cached presigned URLs.
+            Dict of (URI string,
+            (time.monotonic() to refresh, presigned URL, duration)).
+            A URL is refreshed at a half of its lifetime.
+        _CACHED_PRESIGNED_URLS_LOCK:
+            Lock to update/evict entries in _CACHED_PRESIGNED_URLS.
+        _CACHED_CREDENTIALS:
+            Credentials parsed from a private key file for presigned URLs.
+            Cached per (private_key_file, its mtime).
+        _EXECUTOR:
+            Thread pool shared by cp_batch() and rm_batch().
+        _EXECUTOR_LOCK:
+            Lock to create/replace _EXECUTOR and to submit tasks to it.
+            init_gcsuri() cannot shut down the pool while a batch is being submitted.
+        _MULTIPART_UPLOAD_MAX_SIZE:
+            Max size of a single-request (multipart) upload of
+            google-cloud-storage. A larger one is a resumable upload.
         _GCS_PUBLIC_URL_FORMAT:
             End point for a bucket with public access + key path
     """
@@ -154,11 +242,22 @@ class GCSURI(URIBase):
 
     RETRY_BUCKET: int = 5
     RETRY_BUCKET_DELAY: int = 10
+    MAX_BATCH_SIZE: int = 100
+    MAX_CONCURRENCY: int = 16
+    PARALLEL_UPLOAD_THRESHOLD: int = 0
+    PARALLEL_UPLOAD_CHUNK_SIZE: int = 32 * 1024 * 1024
     USE_GSUTIL_FOR_S3: bool = False
 
     _CACHED_GCS_CLIENTS = {}
     _CACHED_GCS_ANONYMOUS_CLIENTS = {}
+    _CACHED_GCS_CREDENTIALS = None
+    _CACHED_GCS_BUCKETS = {}
     _CACHED_PRESIGNED_URLS = {}
+    _CACHED_PRESIGNED_URLS_LOCK = threading.Lock()
+    _CACHED_CREDENTIALS = {}
+    _EXECUTOR = None
+    _EXECUTOR_LOCK = threading.RLock()
+    _MULTIPART_UPLOAD_MAX_SIZE = 8 * 1024 * 1024
     _GCS_PUBLIC_URL_FORMAT = "http://storage.googleapis.com/{bucket}/{path}"
 
     _LOC_SUFFIX = ".gcs"
@@ -176,46 +275,101 @@ class GCSURI(URIBase):
             self._uri + GCSURI.LOCK_FILE_EXT,
             timeout=timeout,
             poll_interval=poll_interval,
+            thread_id=self._thread_id,
         )
 
     def get_metadata(self, skip_md5=False, make_md5_file=False):
-        exists, mt, sz, md5 = False, None, None, None
+        m = self._get_metadata_from_cache(skip_md5=skip_md5)
+        if m is not None:
+            return m
 
         try:
             b, _ = self.get_blob()
-            # make keys lower-case
-            headers = {k.lower(): v for k, v in b._properties.items()}
-            exists = True
-
-            if not skip_md5:
-                if "md5hash" in headers:
-                    md5 = parse_md5_str(headers["md5hash"])
-                elif "etag" in headers:
-                    md5 = parse_md5_str(headers["etag"])
-                if md5 is None:
-                    # make_md5_file is ignored for GCSURI
-                    md5 = self.md5_from_file
-
-            if "size" in headers:
-                sz = int(headers["size"])
-
-            if "updated" in headers:
-                mt = get_seconds_from_epoch(headers["updated"])
-            elif "timecreated" in headers:
-                mt = get_seconds_from_epoch(headers["timecreated"])
+            # make_md5_file is ignored for GCSURI
+            m = self._get_metadata_from_blob(b, skip_md5=skip_md5)
+            self._update_metadata_cache(m)
+            return m
 
         except Exception:
+            # failure can be transient so it's not cached
             logger.debug("Failed to get metadata from {uri}".format(uri=self._uri))
 
-        return URIMetadata(exists=exists, mtime=mt, size=sz, md5=md5)
+        return URIMetadata(exists=False, mtime=None, size=None, md5=None)
+
+    def _get_metadata_from_blob(self, blob, skip_md5=False):
+        """Parses blob's properties into URIMetadata.
+        Blob's attributes are used as they are (e.g. "updated" is already
+        a timezone-aware datetime) to avoid a generic timestamp parser.
+        """
+        mt, md5 = None, None
+
+        utc_t = blob.updated or blob.time_created
+        if utc_t is not None:
+            mt = utc_t.timestamp()
+
+        if not skip_md5:
+            # etag of JSON API object resource is not md5 hash
+            # (it's based on generation/metageneration).
+            # Composite objects do not have md5hash at all.
+            if blob.md5_hash:
+                md5 = parse_md5_str(blob.md5_hash)
+            if md5 is None:
+                md5 = self._get_md5_from_file(mtime=mt)
+
+        return URIMetadata(exists=True, mtime=mt, size=blob.size, md5=md5)
 
     def read(self, byte=False):
-        blob, _ = self.get_blob()
-        b = blob.download_as_bytes()
+        # download contents without an API call to get blob's metadata
+        b = self._call_on_blob_wo_metadata(lambda blob: blob.download_as_bytes())
         if byte:
             return b
         return b.decode()
 
+    @contextmanager
+    def open(self, mode="rb", chunk_size=None):
+        """Opens a file-like object (BlobReader/BlobWriter) on a blob
+        with a "with" context.
+        Contents are streamed with ranged GETs (or resumable uploads)
+        of chunk_size bytes so that a large file can be processed
+        without loading the whole contents in memory.
+
+        Cached metadata is invalidated after a writer is closed
+        (i.e. after the whole contents are uploaded).
+
+        Args:
+            mode: "r", "rb", "w" or "wb".
+            chunk_size: Chunk size in bytes. Use library's default if None.
+        """
+        is_writer = mode.startswith("w")
+        blob, _ = self.get_blob(new=is_writer)
+        try:
+            with blob.open(mode, chunk_size=chunk_size) as fp:
+                yield fp
+        finally:
+            if is_writer:
+                self.invalidate_metadata_cache()
+
+    def read_with_metadata(
+        self, byte=False, skip_md5=False
+    ) -> Tuple[Union[str, bytes], URIMetadata]:
+        """Reads string/byte from a URI and returns it with URI's metadata.
+        This is more efficient than calling get_metadata() and then read()
+        since blob's properties fetched for read() are reused for metadata.
+        Download is pinned to the generation of those properties
+        so that contents and metadata are for the same version of a file.
+
+        Returns:
+            Tuple of (contents, URIMetadata).
+        """
+        blob, _ = self.get_blob()
+        if blob is None:
+            raise ValueError("Blob does not exist for {f}".format(f=self._uri))
+        m = self._get_metadata_from_blob(blob, skip_md5=skip_md5)
+        b = blob.download_as_bytes(if_generation_match=blob.generation)
+        if byte:
+            return b, m
+        return b.decode(), m
+
     def find_all_files(self):
         cl = GCSURI.get_gcs_client(self._thread_id)
         bucket, path = self.get_bucket_path()
@@ -234,13 +388,19 @@ class GCSURI(URIBase):
 
     def _write(self, s):
         blob, _ = self.get_blob(new=True)
-        blob.upload_from_string(s)
+        try:
+            blob.upload_from_string(s)
+        finally:
+            self.invalidate_metadata_cache()
         # blob.update()
         return
 
     def _rm(self):
         blob, _ = self.get_blob()
-        blob.delete()
+        try:
+            blob.delete()
+        finally:
+            self.invalidate_metadata_cache()
         return
 
     def _cp(self, dest_uri):
@@ -252,38 +412,54 @@ class GCSURI(URIBase):
         from .s3uri import S3URI
         from .abspath import AbsPath
 
-        dest_uri = AutoURI(dest_uri)
+        dest_uri = AutoURI(dest_uri, thread_id=self._thread_id)
 
-        if isinstance(dest_uri, (GCSURI, AbsPath)):
-            src_blob, src_bucket = self.get_blob()
+        if isinstance(dest_uri, GCSURI):
+            src_blob, _ = self.get_blob()
 
             if src_blob is None:
                 raise ValueError("Blob does not exist for {f}".format(f=self._uri))
 
-            if isinstance(dest_uri, GCSURI):
-                _, dest_path = dest_uri.get_bucket_path()
-                _, dest_bucket = dest_uri.get_blob(new=True)
-                src_bucket.copy_blob(src_blob, dest_bucket, dest_path)
-                return True
+            # server-side rewrite instead of copy_blob() (objects.copy).
+            # rewrite can take multiple calls for a large object
+            # (or cross-location/storage class) so loop until done.
+            dest_blob, _ = dest_uri.get_blob(new=True)
+            try:
+                token, _, _ = dest_blob.rewrite(src_blob)
+                while token is not None:
+                    token, _, _ = dest_blob.rewrite(src_blob, token=token)
+            finally:
+                dest_uri.invalidate_metadata_cache()
+            return True
 
-            elif isinstance(dest_uri, AbsPath):
-                dest_uri.mkdir_dirname()
-                # mtime is not updated without update().
-                src_blob.update()
-                src_blob.download_to_filename(dest_uri._uri)
-                return True
+        elif isinstance(dest_uri, AbsPath):
+            dest_uri.mkdir_dirname()
+            # Blob() is made without an API call to get its metadata.
+            # Its "updated" is unknown so that download_to_filename()
+            # does not set mtime of a local copy to source's mtime.
+            self._call_on_blob_wo_metadata(
+                lambda blob: blob.download_to_filename(dest_uri._uri)
+            )
+            return True
 
         elif isinstance(dest_uri, S3URI):
             if GCSURI.USE_GSUTIL_FOR_S3:
                 rc = check_call(["gsutil", "-q", "cp", self._uri, dest_uri._uri])
                 return rc == 0
             else:
-                # use local temporary file instead
-                with TemporaryDirectory() as tmp_d:
-                    dest_uri_local = AbsPath(os.path.join(tmp_d, self.basename))
-                    # lockless copy
-                    self.cp(dest_uri=dest_uri_local, no_lock=True, no_checksum=True)
-                    dest_uri_local.cp(dest_uri=dest_uri, no_lock=True, no_checksum=True)
+                # stream blob directly to S3 without a local temporary file.
+                src_blob, _ = self.get_blob()
+                if src_blob is None:
+                    raise ValueError("Blob does not exist for {f}".format(f=self._uri))
+                dest_bucket, dest_path = dest_uri.get_bucket_path()
+                cl = S3URI.get_boto3_client(self._thread_id)
+                with src_blob.open("rb") as fp:
+                    cl.upload_fileobj(
+                        Fileobj=fp,
+                        Bucket=dest_bucket,
+                        Key=dest_path,
+                        Config=S3URI.get_transfer_config(),
+                    )
                 return True
 
         return False
@@ -298,52 +474,112 @@ class GCSURI(URIBase):
         from .abspath import AbsPath
         from .httpurl import HTTPURL
 
-        src_uri = AutoURI(src_uri)
+        src_uri = AutoURI(src_uri, thread_id=self._thread_id)
 
-        if isinstance(src_uri, AbsPath):
-            blob, _ = self.get_blob(new=True)
-            blob.upload_from_filename(src_uri._uri)
-            return True
-
-        elif isinstance(src_uri, S3URI):
-            if GCSURI.USE_GSUTIL_FOR_S3:
-                rc = check_call(["gsutil", "-q", "cp", src_uri._uri, self._uri])
-                return rc == 0
-            else:
-                # use local temporary file instead
-                with TemporaryDirectory() as tmp_d:
-                    dest_uri_local = AbsPath(os.path.join(tmp_d, self.basename))
-                    src_uri.cp(dest_uri=dest_uri_local, no_lock=True, no_checksum=True)
-                    dest_uri_local.cp(dest_uri=self, no_lock=True, no_checksum=True)
+        try:
+            if isinstance(src_uri, AbsPath):
+                blob, _ = self.get_blob(new=True)
+                if (
+                    GCSURI.PARALLEL_UPLOAD_THRESHOLD > 0
+                    and src_uri.size > GCSURI.PARALLEL_UPLOAD_THRESHOLD
+                ):
+                    transfer_manager.upload_chunks_concurrently(
+                        src_uri._uri,
+                        blob,
+                        chunk_size=GCSURI.PARALLEL_UPLOAD_CHUNK_SIZE,
+                        worker_type=transfer_manager.THREAD,
+                        max_workers=GCSURI.MAX_CONCURRENCY,
+                    )
+                else:
+                    blob.upload_from_filename(src_uri._uri)
                 return True
 
-        elif isinstance(src_uri, HTTPURL):
-            r = requests.get(
-                src_uri._uri,
-                stream=True,
-                allow_redirects=True,
-                headers=requests.utils.default_headers(),
-            )
-            r.raise_for_status()
-            with NamedTemporaryFile() as fp:
-                for chunk in r.iter_content(HTTPURL.get_http_chunk_size()):
-                    fp.write(chunk)
-                fp.seek(0)
-                blob, _ = self.get_blob(new=True)
-                blob.upload_from_file(fp)
-            return True
-        return False
+            elif isinstance(src_uri, S3URI):
+                if GCSURI.USE_GSUTIL_FOR_S3:
+                    rc = check_call(["gsutil", "-q", "cp", src_uri._uri, self._uri])
+                    return rc == 0
+                else:
+                    # stream S3 object's body directly to GCS without a local temporary file.
+                    src_bucket, src_path = src_uri.get_bucket_path()
+                    cl = S3URI.get_boto3_client(self._thread_id)
+                    obj = cl.get_object(Bucket=src_bucket, Key=src_path)
+                    blob, _ = self.get_blob(new=True)
+                    # obj["Body"] is not seekable so it cannot be given to
+                    # a resumable upload of upload_from_file().
+                    # BlobWriter buffers body and uploads it chunk by chunk.
+                    with blob.open("wb") as fp:
+                        shutil.copyfileobj(obj["Body"], fp, S3URI.MULTIPART_CHUNK_SIZE)
+                    return True
+
+            elif isinstance(src_uri, HTTPURL):
+                with HTTPURL.get_session(self._thread_id).get(
+                    src_uri._uri, stream=True, allow_redirects=True
+                ) as r:
+                    r.raise_for_status()
+                    # stream response body directly to GCS without a temporary file.
+                    r.raw.decode_content = True
+                    blob, _ = self.get_blob(new=True)
+                    size = None
+                    if "content-length" in r.headers and not r.headers.get(
+                        "content-encoding"
+                    ):
+                        size = int(r.headers["content-length"])
+                    if size is not None and size <= GCSURI._MULTIPART_UPLOAD_MAX_SIZE:
+                        # small body of a known size is uploaded
+                        # in a single (multipart) request
+                        # instead of a resumable upload (two requests at least).
+                        blob.upload_from_file(r.raw, size=size)
+                    else:
+                        # r.raw is not seekable and its tell() counts encoded
+                        # (e.g. gzipped) bytes so it cannot be given to
+                        # a resumable upload of upload_from_file().
+                        # BlobWriter buffers decoded body and uploads it
+                        # chunk by chunk.
+                        with blob.open("wb") as fp:
+                            shutil.copyfileobj(r.raw, fp, HTTPURL.get_http_chunk_size())
+                return True
+            return False
+        finally:
+            # blob has been (or might have been) changed
+            self.invalidate_metadata_cache()
+
+    def _call_on_blob_wo_metadata(self, func):
+        """Calls func(blob) on a Blob() made without an API call to get its metadata
+        (objects.get) so that a download takes one round trip only.
+        If forbidden, then retry with an anonymous client (e.g. public bucket).
+
+        Raises:
+            ValueError if blob does not exist.
+        """
+        bucket, path = self.get_bucket_path()
+        try:
+            try:
+                bucket_obj = GCSURI._get_bucket(self._thread_id, bucket)
+                return func(Blob(name=path, bucket=bucket_obj))
+            except Forbidden:
+                logger.debug("Blob is forbidden. Trying again with anonymous client.")
+                bucket_obj = GCSURI._get_bucket(self._thread_id, bucket, anonymous=True)
+                return func(Blob(name=path, bucket=bucket_obj))
+        except NotFound:
+            raise ValueError("Blob does not exist for {f}".format(f=self._uri))
 
     def get_blob(self, new=False) -> Blob:
         """GCS Client() has a bug that shows an outdated version of a file
         when using Blob() without update().
-        For read-only functions (e.g. read()), need to directly call
-        cl.get_bucket(bucket).get_blob(path) instead of using Blob() class.
+        For functions reading blob's metadata (e.g. get_metadata()), need to directly call
+        bucket_obj.get_blob(path) instead of using Blob() class.
+        For a new blob to be written (new=True), Blob() is used without any API call.
+        Contents can be downloaded without metadata.
+        See GCSURI._call_on_blob_wo_metadata() for details.
+
+        Bucket object is cached per (thread_id, bucket) and it is made with
+        Client.bucket(), which does not make an API call to get bucket's metadata.
+        See GCSURI._get_bucket() for details.
 
         Also, GCS Client() is not thread-safe and it fails for a variety of reasons.
         Retry several times for whatever reasons.
 
-        Client.get_bucket() and Client.get_bucket().get_blob() can fail
+        Bucket.get_blob() can fail
         even if the bucket is public (Storage Reader permission for allUsers
         or allAuthenticatedUsers).
         Needs an anonymous client (Client.create_anonymous_client()) for public buckets.
@@ -356,22 +592,25 @@ class GCSURI(URIBase):
                 Bucket object
         """
         bucket, path = self.get_bucket_path()
-        cl = GCSURI.get_gcs_client(self._thread_id)
 
+        anonymous = False
         bucket_obj = None
         blob = None
         for retry in range(GCSURI.RETRY_BUCKET):
             try:
-                bucket_obj = cl.get_bucket(bucket)
-                blob = bucket_obj.get_blob(path)
-                if new and blob is None:
+                bucket_obj = GCSURI._get_bucket(
+                    self._thread_id, bucket, anonymous=anonymous
+                )
+                if new:
                     blob = Blob(name=path, bucket=bucket_obj)
+                else:
+                    blob = bucket_obj.get_blob(path)
                 break
             except Forbidden:
                 logger.debug(
                     "Bucket/blob is forbidden. Trying again with anonymous client."
                 )
-                cl = GCSURI.get_gcs_anonymous_client(self._thread_id)
+                anonymous = True
             except NotFound:
                 raise
             except PermissionDenied:
@@ -388,38 +627,45 @@ class GCSURI(URIBase):
         return blob, bucket_obj
 
     def get_bucket_path(self) -> Tuple[str, str]:
-        """Returns a tuple of URI's S3 bucket and path."""
-        arr = self.uri_wo_scheme.split(GCSURI.get_path_sep(), maxsplit=1)
-        if len(arr) == 1:
-            # root directory without path (key)
-            bucket, path = arr[0], ""
-        else:
-            bucket, path = arr
-        return bucket, path
+        """Returns a tuple of URI's GCS bucket and path.
+        It is split only once and then memoized on the object.
+        AutoURI can change its class without calling __init__()
+        so it's memoized here instead of in __init__().
+        """
+        bucket_path = getattr(self, "_bucket_path", None)
+        if bucket_path is None:
+            arr = self.uri_wo_scheme.split(GCSURI.get_path_sep(), maxsplit=1)
+            if len(arr) == 1:
+                # root directory without path (key)
+                bucket_path = arr[0], ""
+            else:
+                bucket_path = tuple(arr)
+            self._bucket_path = bucket_path
+        return bucket_path
 
     def get_presigned_url(
         self, duration=None, private_key_file=None, use_cached=False
     ) -> str:
         """
         Args:
-            duration: Duration in seconds. This is ignored if use_cached is on.
-            use_cached: Use a cached URL.
+            duration: Duration in seconds.
+            use_cached: Use a cached URL if it's not older than
+                a half of its duration. If duration is given then
+                a cached URL made with a different duration is not used.
         """
-        cache = GCSURI._CACHED_PRESIGNED_URLS
         if use_cached:
-            if cache is not None and self._uri in cache:
-                return cache[self._uri]
+            cached = GCSURI._CACHED_PRESIGNED_URLS.get(self._uri)
+            if (
+                cached is not None
+                and time.monotonic() < cached[0]
+                and (duration is None or duration == cached[2])
+            ):
+                return cached[1]
         # if not self.exists:
         #     raise Exception('File does not exist. f={f}'.format(self._uri))
         if private_key_file is None:
-            private_key_file = os.path.expanduser(GCSURI.PRIVATE_KEY_FILE)
-        else:
-            private_key_file = os.path.expanduser(private_key_file)
-        if not os.path.exists(private_key_file):
-            raise Exception(
-                "GCS private key file not found. f:{f}".format(f=private_key_file)
-            )
-        credentials = Credentials.from_service_account_file(private_key_file)
+            private_key_file = GCSURI.PRIVATE_KEY_FILE
+        credentials = GCSURI._get_credentials(private_key_file)
         duration = duration if duration is not None else GCSURI.DURATION_PRESIGNED_URL
         blob, _ = self.get_blob()
         if blob is None:
@@ -427,13 +673,271 @@ class GCSURI(URIBase):
         url = blob.generate_signed_url(
             expiration=timedelta(seconds=duration), credentials=credentials
         )
-        cache[self._uri] = url
+        GCSURI._update_presigned_url_cache(self._uri, url, duration)
         return url
 
+    @staticmethod
+    def _update_presigned_url_cache(uri, url, duration):
+        """Caches a presigned URL until a half of its lifetime.
+        An updated entry is moved to the end of dict and
+        stale entries are evicted from the front.
+        """
+        now = time.monotonic()
+        cache = GCSURI._CACHED_PRESIGNED_URLS
+        with GCSURI._CACHED_PRESIGNED_URLS_LOCK:
+            cache.pop(uri, None)
+            cache[uri] = (now + duration / 2, url, duration)
+            while cache:
+                oldest = next(iter(cache))
+                if now < cache[oldest][0]:
+                    break
+                del cache[oldest]
+
     def get_public_url(self) -> str:
         bucket, path = self.get_bucket_path()
         return GCSURI._GCS_PUBLIC_URL_FORMAT.format(bucket=bucket, path=path)
 
+    @staticmethod
+    def _get_credentials(private_key_file) -> Credentials:
+        """Credentials from a private key file.
+        Parsing a key file (JSON + RSA private key) is expensive
+        so it is cached per (private_key_file, mtime).
+        Cache is missed if the key file is modified.
+        """
+        private_key_file = os.path.expanduser(private_key_file)
+        try:
+            mtime = os.path.getmtime(private_key_file)
+        except OSError:
+            raise Exception(
+                "GCS private key file not found. f:{f}".format(f=private_key_file)
+            )
+        key = (private_key_file, mtime)
+        credentials = GCSURI._CACHED_CREDENTIALS.get(key)
+        if credentials is None:
+            credentials = Credentials.from_service_account_file(private_key_file)
+            GCSURI._CACHED_CREDENTIALS[key] = credentials
+        return credentials
+
+    @staticmethod
+    def get_metadata_batch(
+        uris, skip_md5=False, thread_id=-1
+    ) -> Dict[str, URIMetadata]:
+        """Metadata of multiple URIs.
+        Lookups are grouped by bucket and sent as GCS JSON API batch requests
+        (up to GCSURI.MAX_BATCH_SIZE lookups per HTTP request)
+        instead of making a round trip for each URI.
+
+        If a lookup fails for a reason other than non-existence
+        (e.g. Forbidden on a public bucket), then fall back to get_metadata()
+        for such URI.
+
+        Returns:
+            Dict of (URI string, URIMetadata).
+        """
+        cl = GCSURI.get_gcs_client(thread_id)
+
+        uris_per_bucket = defaultdict(list)
+        for uri in uris:
+            u = GCSURI(uri, thread_id=thread_id)
+            bucket, _ = u.get_bucket_path()
+            uris_per_bucket[bucket].append(u)
+
+        result = {}
+        for bucket, us in uris_per_bucket.items():
+            bucket_obj = GCSURI._get_bucket(thread_id, bucket)
+
+            for i in range(0, len(us), GCSURI.MAX_BATCH_SIZE):
+                j = i + GCSURI.MAX_BATCH_SIZE
+                us_batch = us[i:j]
+                blobs = [
+                    Blob(name=u.get_bucket_path()[1], bucket=bucket_obj)
+                    for u in us_batch
+                ]
+                try:
+                    with cl.batch(raise_exception=False):
+                        for blob in blobs:
+                            blob.reload()
+                except Exception:
+                    logger.debug(
+                        "Failed to get metadata in batch from bucket {b}".format(
+                            b=bucket
+                        )
+                    )
+
+                for u, blob in zip(us_batch, blobs):
+                    properties = blob._properties
+                    if isinstance(properties, dict) and "name" in properties:
+                        result[u.uri] = u._get_metadata_from_blob(
+                            blob, skip_md5=skip_md5
+                        )
+                    elif (
+                        isinstance(properties, dict)
+                        and properties.get("error", {}).get("code") == 404
+                    ):
+                        result[u.uri] = URIMetadata(
+                            exists=False, mtime=None, size=None, md5=None
+                        )
+                    else:
+                        result[u.uri] = u.get_metadata(skip_md5=skip_md5)
+
+        return result
+
+    @staticmethod
+    def prefetch_metadata(prefix_uri, thread_id=-1) -> Dict[str, URIMetadata]:
+        """Metadata of all files under a prefix (e.g. a directory) from a listing.
+        A listing returns up to 1000 objects per request
+        with only fields required for metadata.
+        Metadata is cached (if METADATA_CACHE_TTL > 0)
+        so that get_metadata() on these files doesn't make a request.
+
+        Objects without md5 hash (e.g. composite objects) are not cached
+        since md5 can be taken from md5 file (.md5) only.
+
+        Returns:
+            Dict of (URI string, URIMetadata).
+        """
+        cl = GCSURI.get_gcs_client(thread_id)
+        bucket, prefix = GCSURI(prefix_uri, thread_id=thread_id).get_bucket_path()
+        scheme = GCSURI.get_schemes()[0]
+        sep = GCSURI.get_path_sep()
+
+        result = {}
+        blobs = cl.list_blobs(
+            bucket,
+            prefix=prefix,
+            fields="items(name,size,md5Hash,updated,timeCreated),nextPageToken",
+        )
+        for blob in blobs:
+            if not blob.md5_hash:
+                continue
+            u = GCSURI(scheme + sep.join([bucket, blob.name]), thread_id=thread_id)
+            m = u._get_metadata_from_blob(blob)
+            u._update_metadata_cache(m)
+            result[u.uri] = m
+        return result
+
+    @staticmethod
+    def exists_batch(uris, thread_id=-1) -> Dict[str, bool]:
+        """Existence of multiple URIs.
+        This is get_metadata_batch() with skip_md5=True, so that
+        md5 file (.md5) is never looked up for a blob without md5 hash.
+
+        Returns:
+            Dict of (URI string, bool).
+        """
+        result = GCSURI.get_metadata_batch(uris, skip_md5=True, thread_id=thread_id)
+        return {uri: m.exists for uri, m in result.items()}
+
+    @staticmethod
+    def cp_batch(
+        pairs,
+        no_lock=False,
+        no_checksum=False,
+        make_md5_file=False,
+    ) -> List[str]:
+        """Makes copies of multiple (src_uri, dest_uri) pairs concurrently.
+        Source URIs can be on any storage. See URIBase.cp() for parameters.
+
+        Copies are made on a shared thread pool (GCSURI.MAX_CONCURRENCY threads)
+        to overlap latency of API calls.
+
+        Returns:
+            List of URI strings of copies on destination in the same order as pairs.
+        """
+        with GCSURI._EXECUTOR_LOCK:
+            executor = GCSURI._get_executor()
+            futures = [
+                executor.submit(
+                    gcsuri_cp,
+                    src_uri,
+                    dest_uri,
+                    no_lock=no_lock,
+                    no_checksum=no_checksum,
+                    make_md5_file=make_md5_file,
+                )
+                for src_uri, dest_uri in pairs
+            ]
+        return GCSURI._wait_for_futures(futures, action="cp_batch")
+
+    @staticmethod
+    def rm_batch(uris, no_lock=False, silent=False):
+        """Removes multiple URIs concurrently.
+        Files are deleted on a shared thread pool (GCSURI.MAX_CONCURRENCY threads)
+        to overlap latency of API calls.
+        """
+        with GCSURI._EXECUTOR_LOCK:
+            executor = GCSURI._get_executor()
+            futures = [
+                executor.submit(autouri_rm, uri, no_lock=no_lock, silent=silent)
+                for uri in uris
+            ]
+        GCSURI._wait_for_futures(futures, action="rm_batch")
+
+    @staticmethod
+    def read_batch(uris, byte=False) -> List[Union[str, bytes]]:
+        """Reads multiple URIs concurrently.
+        Files are read on a shared thread pool (GCSURI.MAX_CONCURRENCY threads)
+        to overlap latency of API calls.
+
+        Returns:
+            List of contents in the same order as uris.
+        """
+        with GCSURI._EXECUTOR_LOCK:
+            executor = GCSURI._get_executor()
+            futures = [executor.submit(autouri_read, uri, byte=byte) for uri in uris]
+        return GCSURI._wait_for_futures(futures, action="read_batch")
+
+    @staticmethod
+    def _wait_for_futures(futures, action) -> List[Any]:
+        """Waits for all futures to complete and then collects their results.
+        If any of them failed, then raise the first exception
+        after logging all exceptions.
+        """
+        wait(futures)
+
+        errors = [f.exception() for f in futures if f.exception() is not None]
+        for e in errors:
+            logger.error("{action}: failed. {err}".format(action=action, err=str(e)))
+        if errors:
+            raise errors[0]
+
+        return [f.result() for f in futures]
+
+    @staticmethod
+    def _get_executor() -> ThreadPoolExecutor:
+        """Creates a shared thread pool lazily.
+        Hold GCSURI._EXECUTOR_LOCK while submitting tasks to a returned pool.
+        """
+        with GCSURI._EXECUTOR_LOCK:
+            if GCSURI._EXECUTOR is None:
+                GCSURI._EXECUTOR = ThreadPoolExecutor(
+                    max_workers=GCSURI.MAX_CONCURRENCY
+                )
+            return GCSURI._EXECUTOR
+
+    @staticmethod
+    def _get_bucket(thread_id, bucket, anonymous=False) -> Bucket:
+        """Get Bucket object per (thread_id, bucket).
+        Unlike Client.get_bucket(), Client.bucket() does not make an API call
+        to get bucket's metadata, which is not used in this module.
+
+        Args:
+            anonymous:
+                Use an anonymous client instead. For public buckets.
+        """
+        key = (thread_id, bucket, anonymous)
+        bucket_obj = GCSURI._CACHED_GCS_BUCKETS.get(key)
+
+        if bucket_obj is None:
+            if anonymous:
+                cl = GCSURI.get_gcs_anonymous_client(thread_id)
+            else:
+                cl = GCSURI.get_gcs_client(thread_id)
+            bucket_obj = cl.bucket(bucket)
+            GCSURI._CACHED_GCS_BUCKETS[key] = bucket_obj
+
+        return bucket_obj
+
     @staticmethod
     def get_gcs_client(thread_id) -> storage.Client:
         """Get GCS client per thread_id.
@@ -455,7 +959,8 @@ class GCSURI(URIBase):
         if cl is None:
             try:
                 logger.debug("New GCS client for thread {id}.".format(id=thread_id))
-                cl = storage.Client()
+                credentials, project = GCSURI._get_default_credentials()
+                cl = storage.Client(project=project, credentials=credentials)
             except DefaultCredentialsError:
                 cl = GCSURI.get_gcs_anonymous_client(thread_id)
             # anonymous client can also be cached here
@@ -463,6 +968,22 @@ class GCSURI(URIBase):
 
         return cl
 
+    @staticmethod
+    def _get_default_credentials() -> Tuple[Any, Optional[str]]:
+        """Default credentials and project (google.auth.default()).
+        They are resolved only once and shared by all per-thread clients
+        so that an access token is not fetched/refreshed separately
+        for each thread.
+
+        Raises:
+            DefaultCredentialsError if default credentials are not found.
+        """
+        if GCSURI._CACHED_GCS_CREDENTIALS is None:
+            GCSURI._CACHED_GCS_CREDENTIALS = google.auth.default(
+                scopes=storage.Client.SCOPE
+            )
+        return GCSURI._CACHED_GCS_CREDENTIALS
+
     @staticmethod
     def get_gcs_anonymous_client(thread_id) -> storage.Client:
         """Get GCS anonymous client per thread_id."""
@@ -485,6 +1006,10 @@ class GCSURI(URIBase):
         retry_bucket: Optional[int] = None,
         retry_bucket_delay: Optional[int] = None,
         use_gsutil_for_s3: Optional[bool] = None,
+        max_concurrency: Optional[int] = None,
+        metadata_cache_ttl: Optional[float] = None,
+        parallel_upload_threshold: Optional[int] = None,
+        parallel_upload_chunk_size: Optional[int] = None,
     ):
         if loc_prefix is not None:
             GCSURI.LOC_PREFIX = loc_prefix
@@ -498,3 +1023,18 @@ class GCSURI(URIBase):
             GCSURI.RETRY_BUCKET_DELAY = retry_bucket_delay
         if use_gsutil_for_s3 is not None:
             GCSURI.USE_GSUTIL_FOR_S3 = use_gsutil_for_s3
+        if max_concurrency is not None:
+            # thread pool will be re-created with a new size.
+            # tasks already submitted to an old pool still run to completion
+            with GCSURI._EXECUTOR_LOCK:
+                GCSURI.MAX_CONCURRENCY = max_concurrency
+                if GCSURI._EXECUTOR is not None:
+                    GCSURI._EXECUTOR.shutdown(wait=False)
+                    GCSURI._EXECUTOR = None
+        if metadata_cache_ttl is not None:
+            GCSURI.METADATA_CACHE_TTL = metadata_cache_ttl
+            URIBase.clear_metadata_cache()
+        if parallel_upload_threshold is not None:
+            GCSURI.PARALLEL_UPLOAD_THRESHOLD = parallel_upload_threshold
+        if parallel_upload_chunk_size is not None:
+            GCSURI.PARALLEL_UPLOAD_CHUNK_SIZE = parallel_upload_chunk_size
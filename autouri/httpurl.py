@@ -1,11 +1,14 @@
 import hashlib
 import logging
+import shutil
 from typing import Optional
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 from .autouri import AutoURI, URIBase
-from .metadata import URIMetadata, get_seconds_from_epoch, parse_md5_str
+from .metadata import URIMetadata, get_seconds_from_http_date, parse_md5_str
 
 logger = logging.getLogger(__name__)
 
@@ -18,11 +21,28 @@ class HTTPURL(URIBase):
     """
     Class constants:
         HTTP_CHUNK_SIZE:
-            Dict to replace path prefix with URL prefix.
-            Useful to convert absolute path into URL on a web server.
+            Chunk size in bytes to stream a response body (4 MB by default).
+            Must be a multiple of 256 KB. A small chunk size makes a tight
+            per-chunk Python loop, which is CPU-expensive for large files.
+        HTTP_POOL_CONNECTIONS:
+            Number of hosts to keep a connection pool for in a session.
+        HTTP_MAX_RETRIES:
+            Number of retries on a connection error or 502/503/504.
+
+    Protected class constants:
+        _CACHED_SESSIONS:
+            Per-thread requests.Session so that TCP/TLS connections
+            are reused across calls instead of being made for each call.
+        _HEAD_FALLBACK_STATUS_CODES:
+            get_metadata() sends HEAD and falls back to GET on these status codes.
     """
 
-    HTTP_CHUNK_SIZE: int = 256 * 1024
+    HTTP_CHUNK_SIZE: int = 4 * 1024 * 1024
+    HTTP_POOL_CONNECTIONS: int = 16
+    HTTP_MAX_RETRIES: int = 5
+
+    _CACHED_SESSIONS = {}
+    _HEAD_FALLBACK_STATUS_CODES = (403, 405, 501)
 
     _LOC_SUFFIX = ".url"
     _SCHEMES = ("http://", "https://")
@@ -34,16 +54,26 @@ class HTTPURL(URIBase):
     def loc_dirname(self):
         """Dirname of URL is not very meaningful.
         Therefore, hash string of the whole URL string is used instead for localization.
+        It is memoized on the object like GCSURI.get_bucket_path().
         """
-        return hashlib.md5(self._uri.encode("utf-8")).hexdigest()
+        loc_dirname = getattr(self, "_loc_dirname", None)
+        if loc_dirname is None:
+            loc_dirname = hashlib.md5(self._uri.encode("utf-8")).hexdigest()
+            self._loc_dirname = loc_dirname
+        return loc_dirname
 
     @property
     def basename(self):
         """Parses a URL to get a basename.
         This class can only work with a URL with an explicit basename
         which can be suffixed with extra parameters starting with ? only.
+        It is memoized on the object.
         """
-        return super().basename.split("?", 1)[0]
+        basename = getattr(self, "_basename", None)
+        if basename is None:
+            basename = super().basename.split("?", 1)[0]
+            self._basename = basename
+        return basename
 
     def _get_lock(self, timeout=None, poll_interval=None):
         raise ReadOnlyStorageError(
@@ -58,20 +88,33 @@ class HTTPURL(URIBase):
         but corresponding URL on a public bucket will still have
         "Last-modified" property which is pointing to creation time.
         """
+        m = self._get_metadata_from_cache(skip_md5=skip_md5)
+        if m is not None:
+            return m
+
         exists, mt, sz, md5 = False, None, None, None
         try:
             # get header only
-            r = requests.get(
-                self._uri,
-                stream=True,
-                allow_redirects=True,
-                headers=requests.utils.default_headers(),
-            )
+            session = HTTPURL.get_session(self._thread_id)
+            r = session.head(self._uri, allow_redirects=True)
+            if r.status_code in HTTPURL._HEAD_FALLBACK_STATUS_CODES:
+                # HEAD is not allowed (e.g. presigned URL signed for GET only)
+                # then get header from GET without reading body
+                with session.get(self._uri, stream=True, allow_redirects=True) as r:
+                    pass
             r.raise_for_status()
-            # make keys lower-case
-            headers = {k.lower(): v for k, v in r.headers.items()}
+            # case-insensitive dict so keys don't need to be lower-cased
+            headers = r.headers
             exists = True
 
+            if "content-length" in headers:
+                sz = int(headers["content-length"])
+            elif "x-goog-stored-content-length" in headers:
+                sz = int(headers["x-goog-stored-content-length"])
+
+            if "last-modified" in headers:
+                mt = get_seconds_from_http_date(headers["last-modified"])
+
             if not skip_md5:
                 if "content-md5" in headers:
                     md5 = parse_md5_str(headers["content-md5"])
@@ -84,15 +127,7 @@ class HTTPURL(URIBase):
                 if md5 is None and "etag" in headers:
                     md5 = parse_md5_str(headers["etag"])
                 if md5 is None:
-                    md5 = self.md5_from_file
-
-            if "content-length" in headers:
-                sz = int(headers["content-length"])
-            elif "x-goog-stored-content-length" in headers:
-                sz = int(headers["x-goog-stored-content-length"])
-
-            if "last-modified" in headers:
-                mt = get_seconds_from_epoch(headers["last-modified"])
+                    md5 = self._get_md5_from_file(mtime=mt)
 
         except requests.exceptions.ConnectionError:
             pass
@@ -101,17 +136,16 @@ class HTTPURL(URIBase):
             if status_code == 403:
                 raise
 
-        return URIMetadata(exists=exists, mtime=mt, size=sz, md5=md5)
+        m = URIMetadata(exists=exists, mtime=mt, size=sz, md5=md5)
+        self._update_metadata_cache(m)
+        return m
 
     def read(self, byte=False):
-        r = requests.get(
-            self._uri,
-            stream=True,
-            allow_redirects=True,
-            headers=requests.utils.default_headers(),
-        )
-        r.raise_for_status()
-        b = r.content
+        with HTTPURL.get_session(self._thread_id).get(
+            self._uri, stream=True, allow_redirects=True
+        ) as r:
+            r.raise_for_status()
+            b = r.content
         if byte:
             return b
         else:
@@ -136,21 +170,18 @@ class HTTPURL(URIBase):
         """
         from autouri.abspath import AbsPath
 
-        dest_uri = AutoURI(dest_uri)
+        dest_uri = AutoURI(dest_uri, thread_id=self._thread_id)
 
         if isinstance(dest_uri, AbsPath):
-            r = requests.get(
-                self._uri,
-                stream=True,
-                allow_redirects=True,
-                headers=requests.utils.default_headers(),
-            )
-            r.raise_for_status()
-            dest_uri.mkdir_dirname()
-            with open(dest_uri._uri, "wb") as f:
-                for chunk in r.iter_content(chunk_size=HTTPURL.HTTP_CHUNK_SIZE):
-                    if chunk:
-                        f.write(chunk)
+            with HTTPURL.get_session(self._thread_id).get(
+                self._uri, stream=True, allow_redirects=True
+            ) as r:
+                r.raise_for_status()
+                # decode (e.g. gunzip) body as iter_content() does
+                r.raw.decode_content = True
+                dest_uri.mkdir_dirname()
+                with open(dest_uri._uri, "wb") as f:
+                    shutil.copyfileobj(r.raw, f, HTTPURL.get_http_chunk_size())
             return True
         return False
 
@@ -164,11 +195,50 @@ class HTTPURL(URIBase):
         return HTTPURL.HTTP_CHUNK_SIZE
 
     @staticmethod
-    def init_httpurl(http_chunk_size: Optional[int] = None):
+    def get_session(thread_id=-1) -> requests.Session:
+        """Get requests.Session per thread_id.
+        requests.Session is not guaranteed to be thread-safe.
+        Connections are pooled per host and retried with a backoff
+        on a connection error or 502/503/504.
+        """
+        session = HTTPURL._CACHED_SESSIONS.get(thread_id)
+
+        if session is None:
+            logger.debug("New HTTP session for thread {id}.".format(id=thread_id))
+            session = requests.Session()
+            session.headers.update(requests.utils.default_headers())
+            retry = Retry(
+                total=HTTPURL.HTTP_MAX_RETRIES,
+                backoff_factor=0.2,
+                status_forcelist=(502, 503, 504),
+                raise_on_status=False,
+            )
+            adapter = HTTPAdapter(
+                pool_connections=HTTPURL.HTTP_POOL_CONNECTIONS, max_retries=retry
+            )
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            HTTPURL._CACHED_SESSIONS[thread_id] = session
+
+        return session
+
+    @staticmethod
+    def init_httpurl(
+        http_chunk_size: Optional[int] = None,
+        http_pool_connections: Optional[int] = None,
+        http_max_retries: Optional[int] = None,
+    ):
         if http_chunk_size is not None:
             HTTPURL.HTTP_CHUNK_SIZE = http_chunk_size
-        if HTTPURL.HTTP_CHUNK_SIZE % (256 * 1024) > 0:
+        if http_pool_connections is not None:
+            HTTPURL.HTTP_POOL_CONNECTIONS = http_pool_connections
+        if http_max_retries is not None:
+            HTTPURL.HTTP_MAX_RETRIES = http_max_retries
+        if http_pool_connections is not None or http_max_retries is not None:
+            # sessions will be re-created with new settings
+            HTTPURL._CACHED_SESSIONS.clear()
+        if HTTPURL.HTTP_CHUNK_SIZE <= 0 or HTTPURL.HTTP_CHUNK_SIZE % (256 * 1024) > 0:
             raise ValueError(
-                "HTTPURL.HTTP_CHUNK_SIZE must be a multiple of 256 KB (256*1024) "
+                "HTTPURL.HTTP_CHUNK_SIZE must be a positive multiple of 256 KB (256*1024) "
                 "to be compatible with cloud storage APIs (GCS and AWS S3)."
             )
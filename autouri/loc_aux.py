@@ -1,10 +1,28 @@
 import json
-from typing import Callable, Tuple
+from typing import Any, Callable, Tuple
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def json_loads(contents: str) -> Any:
+    """Parses JSON with orjson if it's installed, which is much faster than json.
+    Falls back to json for what orjson does not accept
+    (e.g. NaN or an integer larger than 64-bit).
+    """
+    if orjson is not None:
+        try:
+            return orjson.loads(contents)
+        except orjson.JSONDecodeError:
+            pass
+    return json.loads(contents)
 
 
 def recurse_json(contents: str, fnc: Callable) -> Tuple[str, bool]:
     """Recurse with a callback function in JSON objects.
-    Converts contents str into dict. This function is a wrapper for recurse_dict.
+    Converts contents str into dict and visits all string values in it.
 
     Args:
         contents:
@@ -22,38 +40,26 @@ def recurse_json(contents: str, fnc: Callable) -> Tuple[str, bool]:
         modified:
             Whether it is modified or not while recursive localization
     """
+    d = json_loads(contents)
+    modified = False
 
-    def recurse_dict(
-        d, fnc, d_parent=None, d_parent_key=None, lst=None, lst_idx=None, modified=False
-    ):
-        """Recurse dict with a callback function.
-        This function modifies mutable d.
-        """
-        if isinstance(d, dict):
-            for k, v in d.items():
-                modified |= recurse_dict(
-                    v, fnc, d_parent=d, d_parent_key=k, modified=modified
-                )
-        elif isinstance(d, list):
-            for i, v in enumerate(d):
-                modified |= recurse_dict(v, fnc, lst=d, lst_idx=i, modified=modified)
-        elif isinstance(d, str):
-            assert d_parent is not None or lst is not None
-            new_val, modified_ = fnc(d)
-            modified |= modified_
-
+    # iterative depth-first walk with an explicit stack of
+    # (value, parent container, key/index in parent).
+    # children are pushed in reverse order to visit them in original order.
+    stack = [(d, None, None)]
+    while stack:
+        val, parent, key = stack.pop()
+        if isinstance(val, dict):
+            stack.extend((v, val, k) for k, v in reversed(list(val.items())))
+        elif isinstance(val, list):
+            stack.extend((v, val, i) for i, v in reversed(list(enumerate(val))))
+        elif isinstance(val, str):
+            assert parent is not None
+            new_val, modified_ = fnc(val)
             if modified_:
-                if d_parent is not None:
-                    d_parent[d_parent_key] = new_val
-                elif lst is not None:
-                    lst[lst_idx] = new_val
-                else:
-                    raise ValueError("Recursion failed.")
-        return modified
-
-    d = json.loads(contents)
-    # d is modified inside of recurse_dict
-    modified = recurse_dict(d, fnc)
+                # d is modified in place
+                parent[key] = new_val
+                modified = True
 
     return json.dumps(d, indent=4), modified
 
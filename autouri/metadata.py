@@ -2,9 +2,9 @@
 """
 import warnings
 from base64 import b64decode
-from binascii import hexlify
 from collections import namedtuple
 from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
 
 from dateparser import parse as dateparser_parse
 from dateutil.parser import parse as dateutil_parse
@@ -30,8 +30,22 @@ def get_seconds_from_epoch(timestamp: str) -> float:
     return (utc_t - utc_epoch).total_seconds()
 
 
+def get_seconds_from_http_date(timestamp: str) -> float:
+    """Parses an HTTP-date (RFC 7231), e.g. Last-Modified header.
+    Falls back to get_seconds_from_epoch() for non-standard formats.
+    """
+    try:
+        utc_t = parsedate_to_datetime(timestamp)
+    except (TypeError, ValueError):
+        return get_seconds_from_epoch(timestamp)
+    if utc_t.tzinfo is None:
+        # "-0000" means UTC without any information about local time
+        utc_t = utc_t.replace(tzinfo=timezone.utc)
+    return utc_t.timestamp()
+
+
 def base64_to_hex(b: str) -> str:
-    return hexlify(b64decode(b)).decode()
+    return b64decode(b).hex()
 
 
 def parse_md5_str(raw: str) -> str:
@@ -56,6 +56,14 @@ def reset_cached_offset():
     cached_offset_between_ntp_server_and_local_system = None
 
 
+def set_cached_offset(offset):
+    """Set offset (timedelta) between NTP server and local system
+    as if it's retrieved from an NTP server.
+    """
+    global cached_offset_between_ntp_server_and_local_system
+    cached_offset_between_ntp_server_and_local_system = offset
+
+
 def get_cached_offset():
     global cached_offset_between_ntp_server_and_local_system
     return cached_offset_between_ntp_server_and_local_system
@@ -2,16 +2,19 @@
     S3 Object versioning must be turned off
 """
 import logging
-from tempfile import NamedTemporaryFile
-from typing import Optional, Tuple
+import os
+import threading
+import time
+from typing import Dict, Optional, Tuple
 
-import requests
 from boto3 import client
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
 from botocore.exceptions import ClientError
 from filelock import BaseFileLock
 
 from .autouri import AutoURI, URIBase
-from .metadata import URIMetadata, get_seconds_from_epoch, parse_md5_str
+from .metadata import URIMetadata, parse_md5_str
 from .ntp_now import now_utc
 
 logger = logging.getLogger(__name__)
@@ -19,28 +22,32 @@ logger = logging.getLogger(__name__)
 
 class S3URILock(BaseFileLock):
     """Locking without using S3 Object Lock.
-    Without S3 object lock, boto3's put_object(), which is used for _write() and _cp() in this module,
-    does not ensure consistency of multiple write operations at the same time.
-    It overwrites for all write requests but the last object written.
-    https://boto3.amazonaws.com/v1/documentation/api/latest/reference/services/s3.html#S3.Client.put_object
+    A .lock file is written with a conditional put_object(IfNoneMatch="*"),
+    which atomically fails with 412 PreconditionFailed if .lock already exists.
+    https://docs.aws.amazon.com/AmazonS3/latest/userguide/conditional-writes.html
 
-    To make this lock as stable as possible, this module uses .lock file with id(self) written on it.
-    This module first checks if .lock does not exist, then tries to write .lock with id(self).
-    It waits for a short time (self._lock_read_delay) and checks if written .lock has the same id(self).
-    self._lock_read_delay is set as poll_interval/10.
+    Therefore, acquiring a lock takes only one request per attempt
+    and there is no race between checking existence of .lock and writing it.
+    id(self) is written on .lock for debugging purposes.
 
     Class constants:
     - LOCK_FILE_EXPIRATION_SEC:
         Expiration of a lock file based on its modtime in seconds
-        If expired then such lock file is ignored.
+        If expired then such lock file is deleted and
+        lock is acquired on a next attempt.
     """
 
     LOCK_FILE_EXPIRATION_SEC = 1800
 
-    def __init__(self, lock_file, timeout=900, poll_interval=10.0, no_lock=False):
+    def __init__(
+        self, lock_file, timeout=900, poll_interval=10.0, no_lock=False, thread_id=-1
+    ):
+        """thread_id is passed to a lock file's URI
+        so that it's accessed with a client of the thread owning this lock.
+        """
         super().__init__(lock_file, timeout=timeout)
         self._poll_interval = poll_interval
-        self._lock_read_delay = self._poll_interval / 10.0
+        self._thread_id = thread_id
 
     def acquire(self, timeout=None, poll_interval=5.0):
         """To use self._poll_interval instead of poll_interval in args."""
@@ -48,32 +55,51 @@ class S3URILock(BaseFileLock):
 
     def _acquire(self):
         """Unlike GCSURI, this module does not use S3 Object locking.
-        This will write id(self) on a .lock file.
+        This will write id(self) on a .lock file only if it does not exist.
         """
-        u = S3URI(self.lock_file)
-        str_id = str(id(self))
+        u = S3URI(self.lock_file, thread_id=self._thread_id)
+        cl = S3URI.get_boto3_client(u.thread_id)
+        bucket, path = u.get_bucket_path()
         try:
-            if (
-                not u.exists
-                or now_utc().timestamp() > u.mtime + S3URILock.LOCK_FILE_EXPIRATION_SEC
-            ):
-                u.write(str_id, no_lock=True)
-                self._context.lock_file_fd = id(self)
-
-            elif u.read() == str_id:
-                self._context.lock_file_fd = id(self)
+            cl.put_object(
+                Bucket=bucket,
+                Key=path,
+                Body=str(id(self)).encode("ascii"),
+                IfNoneMatch="*",
+            )
+            self._context.lock_file_fd = id(self)
 
         except ClientError as e:
             status = e.response["ResponseMetadata"]["HTTPStatusCode"]
             if status in (403,):
                 raise
-        except TypeError:
-            # this happens if file exists and failed to get metadata, so u.mtime is None
-            pass
+            if status in (412,):
+                self._rm_if_expired(cl, bucket, path)
+        finally:
+            u.invalidate_metadata_cache()
         return None
 
+    def _rm_if_expired(self, cl, bucket, path):
+        """Deletes an expired .lock only if it is not overwritten by others
+        (after others deleted it) since its ETag is checked on deletion.
+        """
+        try:
+            m = cl.head_object(Bucket=bucket, Key=path)
+            expires_at = (
+                m["LastModified"].timestamp() + S3URILock.LOCK_FILE_EXPIRATION_SEC
+            )
+            if now_utc().timestamp() > expires_at:
+                cl.delete_object(Bucket=bucket, Key=path, IfMatch=m["ETag"])
+                logger.info(
+                    "Deleted an expired lock file. {f}".format(f=self.lock_file)
+                )
+        except ClientError as e:
+            status = e.response["ResponseMetadata"]["HTTPStatusCode"]
+            if status in (403,):
+                raise
+
     def _release(self):
-        u = S3URI(self.lock_file)
+        u = S3URI(self.lock_file, thread_id=self._thread_id)
         try:
             u.rm(no_lock=True, silent=True)
             self._context.lock_file_fd = None
@@ -90,20 +116,60 @@ class S3URI(URIBase):
         DURATION_PRESIGNED_URL:
             Duration for presigned URLs in seconds.
         S3_COPY_OBJECT_FILE_SIZE_LIMIT:
-            File size limit (in bytes) for S3 copy_object (for s3 to s3 transfer).
+            Deprecated and not used.
+            S3 to S3 transfer is a multipart copy for a file larger than
+            MULTIPART_CHUNK_SIZE.
+        MULTIPART_CHUNK_SIZE:
+            Part size in bytes for multipart upload/download/copy.
+            A file larger than this is transferred as parts.
+        MAX_CONCURRENCY:
+            Number of threads to transfer parts of a file.
+        MAX_POOL_CONNECTIONS:
+            Max number of pooled connections of the shared client.
+            It is at least MAX_CONCURRENCY.
+        MAX_ATTEMPTS:
+            Max number of attempts (with adaptive retry mode) for a request,
+            e.g. on throttling errors (503 SlowDown).
+        CONNECT_TIMEOUT:
+            Timeout in seconds to make a connection.
+        READ_TIMEOUT:
+            Timeout in seconds to read from a connection.
+        USE_ACCELERATE_ENDPOINT:
+            Use S3 Transfer Acceleration endpoint (bucketname.s3-accelerate.amazonaws.com).
+            Transfer Acceleration must be enabled on all buckets to be accessed.
 
     Protected class constants:
-        _CACHED_BOTO3_CLIENTS:
+        _CACHED_BOTO3_CLIENT:
+            Tuple of (pid, boto3 client) shared by all threads in a process.
+        _CACHED_BOTO3_CLIENT_LOCK:
+            Lock to create _CACHED_BOTO3_CLIENT.
+        _CACHED_TRANSFER_CONFIG:
+            boto3 TransferConfig made from MULTIPART_CHUNK_SIZE and MAX_CONCURRENCY.
         _CACHED_PRESIGNED_URLS:
+            Dict of (URI string,
+            (time.monotonic() to refresh, presigned URL, duration)).
+            A URL is refreshed at a half of its lifetime.
+        _CACHED_PRESIGNED_URLS_LOCK:
+            Lock to update/evict entries in _CACHED_PRESIGNED_URLS.
         _S3_PUBLIC_URL_FORMAT:
             End point for a bucket with public access + key path
     """
 
     DURATION_PRESIGNED_URL: int = 4233600
     S3_COPY_OBJECT_FILE_SIZE_LIMIT: int = 5 * 1024 * 1024 * 1024
-
-    _CACHED_BOTO3_CLIENTS = {}
+    MULTIPART_CHUNK_SIZE: int = 16 * 1024 * 1024
+    MAX_CONCURRENCY: int = 10
+    MAX_POOL_CONNECTIONS: int = 50
+    MAX_ATTEMPTS: int = 10
+    CONNECT_TIMEOUT: int = 10
+    READ_TIMEOUT: int = 60
+    USE_ACCELERATE_ENDPOINT: bool = False
+
+    _CACHED_BOTO3_CLIENT = None
+    _CACHED_BOTO3_CLIENT_LOCK = threading.Lock()
+    _CACHED_TRANSFER_CONFIG = None
     _CACHED_PRESIGNED_URLS = {}
+    _CACHED_PRESIGNED_URLS_LOCK = threading.Lock()
     _S3_PUBLIC_URL_FORMAT = "http://{bucket}.s3.amazonaws.com/{path}"
 
     _LOC_SUFFIX = ".s3"
@@ -121,41 +187,55 @@ class S3URI(URIBase):
             self._uri + S3URI.LOCK_FILE_EXT,
             timeout=timeout,
             poll_interval=poll_interval,
+            thread_id=self._thread_id,
         )
 
     def get_metadata(self, skip_md5=False, make_md5_file=False):
+        m = self._get_metadata_from_cache(skip_md5=skip_md5)
+        if m is not None:
+            return m
+
         exists, mt, sz, md5 = False, None, None, None
 
         cl = S3URI.get_boto3_client(self._thread_id)
         bucket, path = self.get_bucket_path()
 
         try:
-            m = cl.head_object(Bucket=bucket, Key=path)["ResponseMetadata"][
-                "HTTPHeaders"
-            ]
-            # make keys lower-case
-            headers = {k.lower(): v for k, v in m.items()}
+            m = cl.head_object(Bucket=bucket, Key=path)
             exists = True
 
+            # use fields already parsed by boto3
+            # (e.g. LastModified is a timezone-aware datetime)
+            if "ContentLength" in m:
+                sz = m["ContentLength"]
+
+            if "LastModified" in m:
+                mt = m["LastModified"].timestamp()
+
             if not skip_md5:
+                # keys of HTTPHeaders are lower-case
+                headers = m.get("ResponseMetadata", {}).get("HTTPHeaders", {})
                 if "content-md5" in headers:
                     md5 = parse_md5_str(headers["content-md5"])
-                elif "etag" in headers:
-                    md5 = parse_md5_str(headers["etag"])
+                elif "ETag" in m:
+                    # ETag of an object uploaded with multipart upload is not md5
+                    # so parse_md5_str() returns None for it
+                    md5 = parse_md5_str(m["ETag"])
                 if md5 is None:
                     # make_md5_file is ignored for S3URI
-                    md5 = self.md5_from_file
-
-            if "content-length" in headers:
-                sz = int(headers["content-length"])
+                    md5 = self._get_md5_from_file(mtime=mt)
 
-            if "last-modified" in headers:
-                mt = get_seconds_from_epoch(headers["last-modified"])
-
-        except Exception:
-            pass
+        except ClientError as e:
+            # HEAD on a missing key returns 403 instead of 404
+            # if caller doesn't have s3:ListBucket permission on the bucket.
+            # transient errors (e.g. 503 SlowDown) are already retried by botocore
+            status = e.response["ResponseMetadata"]["HTTPStatusCode"]
+            if status not in (403, 404):
+                raise
 
-        return URIMetadata(exists=exists, mtime=mt, size=sz, md5=md5)
+        m = URIMetadata(exists=exists, mtime=mt, size=sz, md5=md5)
+        self._update_metadata_cache(m)
+        return m
 
     def read(self, byte=False):
         cl = S3URI.get_boto3_client(self._thread_id)
@@ -207,28 +287,33 @@ class S3URI(URIBase):
         """
         from .abspath import AbsPath
 
-        dest_uri = AutoURI(dest_uri)
+        dest_uri = AutoURI(dest_uri, thread_id=self._thread_id)
         cl = S3URI.get_boto3_client(self._thread_id)
         bucket, path = self.get_bucket_path()
 
         if isinstance(dest_uri, S3URI):
             dest_bucket, dest_path = dest_uri.get_bucket_path()
 
-            if self.size >= S3URI.S3_COPY_OBJECT_FILE_SIZE_LIMIT:
-                copy_function = cl.copy
-            else:
-                copy_function = cl.copy_object
-            copy_function(
+            # managed copy gets object's size (head_object) and then
+            # uses a single copy_object for an object smaller than
+            # MULTIPART_CHUNK_SIZE, otherwise parallel multipart copy (UploadPartCopy).
+            cl.copy(
                 CopySource={"Bucket": bucket, "Key": path},
                 Bucket=dest_bucket,
                 Key=dest_path,
+                Config=S3URI.get_transfer_config(),
             )
             return True
 
         elif isinstance(dest_uri, AbsPath):
             dest_uri.mkdir_dirname()
             with open(dest_uri._uri, "wb") as fp:
-                cl.download_fileobj(Bucket=bucket, Key=path, Fileobj=fp)
+                cl.download_fileobj(
+                    Bucket=bucket,
+                    Key=path,
+                    Fileobj=fp,
+                    Config=S3URI.get_transfer_config(),
+                )
             return True
         return False
 
@@ -240,77 +325,189 @@ class S3URI(URIBase):
         from .abspath import AbsPath
         from .httpurl import HTTPURL
 
-        src_uri = AutoURI(src_uri)
+        src_uri = AutoURI(src_uri, thread_id=self._thread_id)
         cl = S3URI.get_boto3_client(self._thread_id)
         bucket, path = self.get_bucket_path()
 
         if isinstance(src_uri, AbsPath):
-            cl.upload_file(Filename=src_uri._uri, Bucket=bucket, Key=path)
+            cl.upload_file(
+                Filename=src_uri._uri,
+                Bucket=bucket,
+                Key=path,
+                Config=S3URI.get_transfer_config(),
+            )
             return True
 
         elif isinstance(src_uri, HTTPURL):
-            r = requests.get(
-                src_uri._uri,
-                stream=True,
-                allow_redirects=True,
-                headers=requests.utils.default_headers(),
-            )
-            r.raise_for_status()
-            with NamedTemporaryFile() as fp:
-                for chunk in r.iter_content(HTTPURL.get_http_chunk_size()):
-                    fp.write(chunk)
-                fp.seek(0)
-                cl.upload_fileobj(Fileobj=fp, Bucket=bucket, Key=path)
+            with HTTPURL.get_session(self._thread_id).get(
+                src_uri._uri, stream=True, allow_redirects=True
+            ) as r:
+                r.raise_for_status()
+                r.raw.decode_content = True
+                # stream response body directly to S3 without a temporary file.
+                # r.raw is not seekable so boto3 reads it part by part
+                # into memory and uploads parts in parallel.
+                cl.upload_fileobj(
+                    Fileobj=r.raw,
+                    Bucket=bucket,
+                    Key=path,
+                    Config=S3URI.get_transfer_config(),
+                )
             return True
         return False
 
+    @staticmethod
+    def prefetch_metadata(prefix_uri, thread_id=-1) -> Dict[str, URIMetadata]:
+        """Metadata of all files under a prefix (e.g. a directory) from a listing.
+        A listing (ListObjectsV2) returns up to 1000 objects per request.
+        Metadata is cached (if METADATA_CACHE_TTL > 0)
+        so that get_metadata() on these files doesn't make a request.
+
+        Objects whose ETag is not md5 hash (e.g. multipart uploaded objects)
+        are not cached since md5 can be taken from md5 file (.md5) only.
+
+        Returns:
+            Dict of (URI string, URIMetadata).
+        """
+        cl = S3URI.get_boto3_client(thread_id)
+        bucket, prefix = S3URI(prefix_uri, thread_id=thread_id).get_bucket_path()
+        scheme = S3URI.get_schemes()[0]
+        sep = S3URI.get_path_sep()
+
+        result = {}
+        paginator = cl.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+            for obj in page.get("Contents", []):
+                md5 = parse_md5_str(obj["ETag"])
+                if md5 is None:
+                    continue
+                u = S3URI(scheme + sep.join([bucket, obj["Key"]]), thread_id=thread_id)
+                m = URIMetadata(
+                    exists=True,
+                    mtime=obj["LastModified"].timestamp(),
+                    size=obj["Size"],
+                    md5=md5,
+                )
+                u._update_metadata_cache(m)
+                result[u.uri] = m
+        return result
+
     def get_bucket_path(self) -> Tuple[str, str]:
-        """Returns a tuple of URI's S3 bucket and path."""
-        arr = self.uri_wo_scheme.split(S3URI.get_path_sep(), maxsplit=1)
-        if len(arr) == 1:
-            # root directory without path (key)
-            bucket, path = arr[0], ""
-        else:
-            bucket, path = arr
-        return bucket, path
+        """Returns a tuple of URI's S3 bucket and path.
+        It is split only once and then memoized on the object.
+        AutoURI can change its class without calling __init__()
+        so it's memoized here instead of in __init__().
+        """
+        bucket_path = getattr(self, "_bucket_path", None)
+        if bucket_path is None:
+            arr = self.uri_wo_scheme.split(S3URI.get_path_sep(), maxsplit=1)
+            if len(arr) == 1:
+                # root directory without path (key)
+                bucket_path = arr[0], ""
+            else:
+                bucket_path = tuple(arr)
+            self._bucket_path = bucket_path
+        return bucket_path
 
     def get_presigned_url(self, duration=None, use_cached=False) -> str:
         """
         Args:
-            duration: Duration in seconds. This is ignored if use_cached is on.
-            use_cached: Use a cached URL.
+            duration: Duration in seconds.
+            use_cached: Use a cached URL if it's not older than
+                a half of its duration. If duration is given then
+                a cached URL made with a different duration is not used.
         """
-        cache = S3URI._CACHED_PRESIGNED_URLS
         if use_cached:
-            if cache is not None and self._uri in cache:
-                return cache[self._uri]
+            cached = S3URI._CACHED_PRESIGNED_URLS.get(self._uri)
+            if (
+                cached is not None
+                and time.monotonic() < cached[0]
+                and (duration is None or duration == cached[2])
+            ):
+                return cached[1]
         cl = S3URI.get_boto3_client(self._thread_id)
         bucket, path = self.get_bucket_path()
         duration = duration if duration is not None else S3URI.DURATION_PRESIGNED_URL
         url = cl.generate_presigned_url(
             "get_object", Params={"Bucket": bucket, "Key": path}, ExpiresIn=duration
         )
-        cache[self._uri] = url
+        S3URI._update_presigned_url_cache(self._uri, url, duration)
         return url
 
+    @staticmethod
+    def _update_presigned_url_cache(uri, url, duration):
+        """Caches a presigned URL until a half of its lifetime.
+        An updated entry is moved to the end of dict and
+        stale entries are evicted from the front.
+        """
+        now = time.monotonic()
+        cache = S3URI._CACHED_PRESIGNED_URLS
+        with S3URI._CACHED_PRESIGNED_URLS_LOCK:
+            cache.pop(uri, None)
+            cache[uri] = (now + duration / 2, url, duration)
+            while cache:
+                oldest = next(iter(cache))
+                if now < cache[oldest][0]:
+                    break
+                del cache[oldest]
+
     def get_public_url(self) -> str:
         bucket, path = self.get_bucket_path()
         return S3URI._S3_PUBLIC_URL_FORMAT.format(bucket=bucket, path=path)
 
     @staticmethod
     def get_boto3_client(thread_id=-1) -> client:
-        if thread_id in S3URI._CACHED_BOTO3_CLIENTS:
-            return S3URI._CACHED_BOTO3_CLIENTS[thread_id]
-        else:
-            cl = client("s3")
-            S3URI._CACHED_BOTO3_CLIENTS[thread_id] = cl
-            return cl
+        """Returns a boto3 S3 client shared by all threads.
+        Unlike GCS client, boto3 client is thread-safe
+        so thread_id is ignored. Client is created only once (under a lock)
+        since creating a client from a default session is not thread-safe.
+        A forked process (e.g. multiprocessing in rmdir()) makes its own client
+        so that pooled connections are not shared across processes.
+        """
+        pid = os.getpid()
+        cached = S3URI._CACHED_BOTO3_CLIENT
+        if cached is not None and cached[0] == pid:
+            return cached[1]
+        with S3URI._CACHED_BOTO3_CLIENT_LOCK:
+            cached = S3URI._CACHED_BOTO3_CLIENT
+            if cached is None or cached[0] != pid:
+                config = Config(
+                    max_pool_connections=max(
+                        S3URI.MAX_POOL_CONNECTIONS, S3URI.MAX_CONCURRENCY
+                    ),
+                    retries={
+                        "mode": "adaptive",
+                        "total_max_attempts": S3URI.MAX_ATTEMPTS,
+                    },
+                    connect_timeout=S3URI.CONNECT_TIMEOUT,
+                    read_timeout=S3URI.READ_TIMEOUT,
+                )
+                if S3URI.USE_ACCELERATE_ENDPOINT:
+                    # don't override S3 settings in ~/.aws/config if not enabled
+                    config = config.merge(Config(s3={"use_accelerate_endpoint": True}))
+                cached = pid, client("s3", config=config)
+                S3URI._CACHED_BOTO3_CLIENT = cached
+            return cached[1]
+
+    @staticmethod
+    def get_transfer_config() -> TransferConfig:
+        if S3URI._CACHED_TRANSFER_CONFIG is None:
+            S3URI._CACHED_TRANSFER_CONFIG = TransferConfig(
+                multipart_threshold=S3URI.MULTIPART_CHUNK_SIZE,
+                multipart_chunksize=S3URI.MULTIPART_CHUNK_SIZE,
+                max_concurrency=S3URI.MAX_CONCURRENCY,
+                use_threads=True,
+            )
+        return S3URI._CACHED_TRANSFER_CONFIG
 
     @staticmethod
     def init_s3uri(
         loc_prefix: Optional[str] = None,
         duration_presigned_url: Optional[int] = None,
         s3_copy_object_file_size_limit: Optional[int] = None,
+        multipart_chunk_size: Optional[int] = None,
+        max_concurrency: Optional[int] = None,
+        use_accelerate_endpoint: Optional[bool] = None,
     ):
         if loc_prefix is not None:
             S3URI.LOC_PREFIX = loc_prefix
@@ -318,3 +515,13 @@ class S3URI(URIBase):
             S3URI.DURATION_PRESIGNED_URL = duration_presigned_url
         if s3_copy_object_file_size_limit is not None:
             S3URI.S3_COPY_OBJECT_FILE_SIZE_LIMIT = s3_copy_object_file_size_limit
+        if multipart_chunk_size is not None:
+            S3URI.MULTIPART_CHUNK_SIZE = multipart_chunk_size
+            S3URI._CACHED_TRANSFER_CONFIG = None
+        if max_concurrency is not None:
+            S3URI.MAX_CONCURRENCY = max_concurrency
+            S3URI._CACHED_TRANSFER_CONFIG = None
+            S3URI._CACHED_BOTO3_CLIENT = None
+        if use_accelerate_endpoint is not None:
+            S3URI.USE_ACCELERATE_ENDPOINT = use_accelerate_endpoint
+            S3URI._CACHED_BOTO3_CLIENT = None
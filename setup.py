@@ -55,8 +55,9 @@ setuptools.setup(
     install_requires=[
         "requests",
         "pyopenssl",
-        "google-cloud-storage",
-        "boto3",
+        "google-cloud-storage>=2.11.0",
+        "boto3>=1.35.99",
+        "botocore>=1.35.99",
         "awscli",
         "dateparser",
         "filelock>=3.12.0",
@@ -1,3 +1,4 @@
+import functools
 import hashlib
 import os
 
@@ -43,6 +44,12 @@ def pytest_addoption(parser):
         "anyone can access to it via an URL with "
         "an endpoint GCS_ENDPOINT_URL. ",
     )
+    parser.addoption(
+        "--skip-remote",
+        action="store_true",
+        help="Skip tests on remote storages (S3, GCS and URLs on GCS). "
+        "Such tests are also skipped if credentials for them are not found.",
+    )
     parser.addoption(
         "--gcp-private-key-file",
         required=True,
@@ -52,6 +59,36 @@ def pytest_addoption(parser):
     )
 
 
+@functools.lru_cache(maxsize=None)
+def has_aws_credentials():
+    import boto3
+
+    return boto3.Session().get_credentials() is not None
+
+
+@functools.lru_cache(maxsize=None)
+def has_gcp_credentials():
+    import google.auth
+    from google.auth.exceptions import DefaultCredentialsError
+
+    try:
+        google.auth.default()
+    except DefaultCredentialsError:
+        return False
+    return True
+
+
+def skip_if_remote_disabled(request, storage, fnc_has_credentials):
+    """Skips all tests depending on a fixture calling this function.
+    Credentials are checked only once per storage
+    (e.g. google.auth.default() can take seconds to probe a metadata server).
+    """
+    if request.config.getoption("--skip-remote"):
+        pytest.skip("--skip-remote is set.")
+    if not fnc_has_credentials():
+        pytest.skip("Credentials for {storage} not found.".format(storage=storage))
+
+
 @pytest.fixture(scope="session")
 def ci_prefix(request):
     return request.config.getoption("--ci-prefix").rstrip("/")
@@ -60,23 +97,27 @@ def ci_prefix(request):
 @pytest.fixture(scope="session")
 def s3_root(request):
     """S3 root to generate test S3 URIs on."""
+    skip_if_remote_disabled(request, "S3", has_aws_credentials)
     return request.config.getoption("--s3-root").rstrip("/")
 
 
 @pytest.fixture(scope="session")
 def s3_public_url_test_v6_file(request):
+    skip_if_remote_disabled(request, "S3", has_aws_credentials)
     return request.config.getoption("--s3-public-url-test-v6-file")
 
 
 @pytest.fixture(scope="session")
 def gcs_root(request):
     """GCS root to generate test GCS URIs on."""
+    skip_if_remote_disabled(request, "GCS", has_gcp_credentials)
     return request.config.getoption("--gcs-root").rstrip("/")
 
 
 @pytest.fixture(scope="session")
 def gcs_root_url(request):
     """GCS root to generate test URLs on. This GCS bucket should be public."""
+    skip_if_remote_disabled(request, "GCS", has_gcp_credentials)
     return request.config.getoption("--gcs-root-url").rstrip("/")
 
 
@@ -87,8 +128,8 @@ def gcp_private_key_file(request):
 
 
 @pytest.fixture(scope="session")
-def local_test_path(tmpdir_factory, ci_prefix):
-    return tmpdir_factory.mktemp(ci_prefix).realpath()
+def local_test_path(tmp_path_factory, ci_prefix):
+    return str(tmp_path_factory.mktemp(ci_prefix).resolve())
 
 
 @pytest.fixture(scope="session")
@@ -1,6 +1,7 @@
 import os
 import time
 from typing import Any, Tuple
+from unittest.mock import patch
 
 import pytest
 
@@ -224,6 +225,43 @@ def test_abspath_cp(
         u_dest.rm()
 
 
+def test_abspath_cp_match_cache(local_v6_txt, local_test_path) -> "AutoURI":
+    """md5 hash is not calculated again for a pair of files
+    whose md5 hashes are matched before and which have not changed since then.
+    This is enabled only with init_uribase(cp_match_cache=True).
+    """
+    u = AbsPath(local_v6_txt)
+    u_dest = AbsPath(
+        os.path.join(local_test_path, "test_abspath_cp_match_cache", u.basename)
+    )
+    u_dest.write(u.read())
+
+    # disabled by default
+    _, ret = u.cp(u_dest, return_flag=True)
+    assert ret == 1
+    assert not URIBase._CACHED_CP_MATCHES
+
+    URIBase.init_uribase(cp_match_cache=True)
+    try:
+        # md5 is calculated and matched, then cached
+        _, ret = u.cp(u_dest, return_flag=True)
+        assert ret == 1
+
+        with patch.object(AbsPath, "_AbsPath__calc_md5sum") as m:
+            _, ret = u.cp(u_dest, return_flag=True)
+            assert ret == 1
+            assert not m.called
+
+        # destination has changed so it's copied again
+        time.sleep(0.01)
+        u_dest.write("changed")
+        _, ret = u.cp(u_dest, return_flag=True)
+        assert ret == 0 and u_dest.read() == u.read()
+    finally:
+        URIBase.init_uribase(cp_match_cache=False)
+    u_dest.rm()
+
+
 def test_abspath_write(local_test_path):
     u = AbsPath(local_test_path + "/test_abspath_write.tmp")
 
@@ -3,13 +3,16 @@ Here, we test more extreme/edge cases for recursive localization:
     1) Direct/indirect self reference
     2) Remote files with mixed storage types
 """
+import json
 import os
+import threading
 from typing import Tuple
 
 import pytest
 
 from autouri.abspath import AbsPath
-from autouri.autouri import AutoURI, AutoURIRecursionError
+from autouri.autouri import AutoURI, AutoURIRecursionError, URIBase
+from autouri.loc_aux import recurse_json
 
 from .files import recurse_raise_if_uri_not_exist
 
@@ -66,3 +69,28 @@ def test_localize_mixed(
         )
         # check if all URIs defeind in localized JSON file exist
         recurse_raise_if_uri_not_exist(loc_uri)
+
+
+def test_loc_in_parallel(local_test_path):
+    """Each unique URI in contents is localized once in a worker thread
+    and then looked up while recursing contents again.
+    """
+    prefix = os.path.join(local_test_path, "test_loc_in_parallel")
+    uris = [os.path.join(prefix, "f{i}.txt".format(i=i)) for i in range(4)]
+    contents = json.dumps({"a": uris, "b": {"c": uris[0], "d": "not-a-uri"}})
+
+    called = []
+
+    def fnc_loc(uri, thread_id):
+        called.append((uri, thread_id))
+        return uri + ".loc", True
+
+    fnc_lookup = URIBase._localize_in_parallel(contents, recurse_json, fnc_loc)
+    new_contents, modified = recurse_json(contents, fnc_lookup)
+
+    assert modified
+    assert sorted(u for u, _ in called) == sorted(uris)
+    assert threading.get_ident() not in [t for _, t in called]
+    d = json.loads(new_contents)
+    assert d["a"] == [u + ".loc" for u in uris]
+    assert d["b"] == {"c": uris[0] + ".loc", "d": "not-a-uri"}
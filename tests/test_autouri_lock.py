@@ -2,6 +2,7 @@
 """
 import time
 
+import pytest
 from filelock import BaseFileLock, Timeout
 
 from autouri.autouri import AutoURI, URIBase
@@ -11,71 +12,75 @@ class AutoURIFileLockTestException(Exception):
     pass
 
 
-def test_autouri_lock(local_v6_txt, gcs_v6_txt, s3_v6_txt):
-    for v6_txt in (local_v6_txt, gcs_v6_txt, s3_v6_txt):
-        u_lock = AutoURI(v6_txt + URIBase.LOCK_FILE_EXT)
-        lock = AutoURI(v6_txt).get_lock(no_lock=False)
-
-        lock.acquire()
-        try:
-            assert u_lock.exists
-            time.sleep(1)
-        finally:
-            lock.release()
+@pytest.mark.parametrize("v6_txt_fixture", ["local_v6_txt", "gcs_v6_txt", "s3_v6_txt"])
+def test_autouri_lock(request, v6_txt_fixture):
+    v6_txt = request.getfixturevalue(v6_txt_fixture)
+    u_lock = AutoURI(v6_txt + URIBase.LOCK_FILE_EXT)
+    lock = AutoURI(v6_txt).get_lock(no_lock=False)
+
+    lock.acquire()
+    try:
+        assert u_lock.exists
+        time.sleep(0.01)
+    finally:
+        lock.release()
+    assert not u_lock.exists
+
+    # trivial dummy lock
+    lock = AutoURI(v6_txt).get_lock(no_lock=True)
+    assert not isinstance(lock, BaseFileLock)
+
+
+@pytest.mark.parametrize("v6_txt_fixture", ["local_v6_txt", "gcs_v6_txt", "s3_v6_txt"])
+def test_autouri_lock_raise(request, v6_txt_fixture):
+    v6_txt = request.getfixturevalue(v6_txt_fixture)
+    u_lock = AutoURI(v6_txt + URIBase.LOCK_FILE_EXT)
+    lock = AutoURI(v6_txt).get_lock(no_lock=False)
+
+    lock.acquire()
+    try:
+        assert u_lock.exists
+        time.sleep(0.01)
+        raise AutoURIFileLockTestException
+    except AutoURIFileLockTestException:
+        assert True
+    else:
+        assert False
+    finally:
+        lock.release()
         assert not u_lock.exists
 
-        # trivial dummy lock
-        lock = AutoURI(v6_txt).get_lock(no_lock=True)
-        assert not isinstance(lock, BaseFileLock)
 
+@pytest.mark.parametrize("v6_txt_fixture", ["local_v6_txt", "gcs_v6_txt", "s3_v6_txt"])
+def test_autouri_lock_with_context(request, v6_txt_fixture):
+    v6_txt = request.getfixturevalue(v6_txt_fixture)
+    u_lock = AutoURI(v6_txt + URIBase.LOCK_FILE_EXT)
 
-def test_autouri_lock_raise(local_v6_txt, gcs_v6_txt, s3_v6_txt):
-    for v6_txt in (local_v6_txt, gcs_v6_txt, s3_v6_txt):
-        u_lock = AutoURI(v6_txt + URIBase.LOCK_FILE_EXT)
-        lock = AutoURI(v6_txt).get_lock(no_lock=False)
+    with AutoURI(v6_txt).get_lock(no_lock=False):
+        assert u_lock.exists
+        time.sleep(0.01)
+    assert not u_lock.exists
 
-        lock.acquire()
-        try:
-            assert u_lock.exists
-            time.sleep(1)
-            raise AutoURIFileLockTestException
-        except AutoURIFileLockTestException:
-            assert True
-        else:
-            assert False
-        finally:
-            lock.release()
-            assert not u_lock.exists
+    with AutoURI(v6_txt).get_lock(no_lock=True):
+        assert not u_lock.exists
+        time.sleep(0.01)
+    assert not u_lock.exists
 
 
-def test_autouri_lock_with_context(local_v6_txt, gcs_v6_txt, s3_v6_txt):
-    for v6_txt in (local_v6_txt, gcs_v6_txt, s3_v6_txt):
-        u_lock = AutoURI(v6_txt + URIBase.LOCK_FILE_EXT)
+@pytest.mark.parametrize("v6_txt_fixture", ["local_v6_txt", "gcs_v6_txt", "s3_v6_txt"])
+def test_autouri_lock_with_context_raise(request, v6_txt_fixture):
+    v6_txt = request.getfixturevalue(v6_txt_fixture)
+    u_lock = AutoURI(v6_txt + URIBase.LOCK_FILE_EXT)
 
+    try:
         with AutoURI(v6_txt).get_lock(no_lock=False):
             assert u_lock.exists
-            time.sleep(1)
-        assert not u_lock.exists
-
-        with AutoURI(v6_txt).get_lock(no_lock=True):
-            assert not u_lock.exists
-            time.sleep(1)
+            time.sleep(0.01)
+            raise AutoURIFileLockTestException
+    except AutoURIFileLockTestException:
         assert not u_lock.exists
-
-
-def test_autouri_lock_with_context_raise(local_v6_txt, gcs_v6_txt, s3_v6_txt):
-    for v6_txt in (local_v6_txt, gcs_v6_txt, s3_v6_txt):
-        u_lock = AutoURI(v6_txt + URIBase.LOCK_FILE_EXT)
-
-        try:
-            with AutoURI(v6_txt).get_lock(no_lock=False):
-                assert u_lock.exists
-                time.sleep(1)
-                raise AutoURIFileLockTestException
-        except AutoURIFileLockTestException:
-            assert not u_lock.exists
-        else:
-            assert False
+    else:
+        assert False
 
 
 def test_autouri_lock_timeout(local_v6_txt):
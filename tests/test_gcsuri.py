@@ -1,12 +1,21 @@
+import io
 import os
+import threading
 import time
+from datetime import datetime, timedelta, timezone
 from typing import Any, Tuple
+from unittest.mock import MagicMock, patch
 
 import pytest
+from botocore.response import StreamingBody
+from botocore.stub import Stubber
+from google.cloud.storage import Blob, Bucket
 
 from autouri.autouri import AutoURI, URIBase
-from autouri.gcsuri import GCSURI
+from autouri.gcsuri import GCSURI, GCSURILock
 from autouri.httpurl import HTTPURL, ReadOnlyStorageError
+from autouri.metadata import URIMetadata
+from autouri.s3uri import S3URI
 
 from .files import (
     common_paths,
@@ -263,12 +272,134 @@ def test_gcsuri_get_metadata(gcs_v6_txt, v6_txt_size, v6_txt_md5_hash):
     assert not u_md5.exists
 
 
+def test_gcsuri_get_metadata_cache(gcs_test_path):
+    u = GCSURI(os.path.join(gcs_test_path, "test_gcsuri_get_metadata_cache.txt"))
+    u.write("abc")
+
+    GCSURI.init_gcsuri(metadata_cache_ttl=60)
+    try:
+        m1 = u.get_metadata()
+        assert m1.exists
+        assert m1.size == 3
+        assert u.get_metadata() is m1
+        assert u.get_metadata(skip_md5=True) is m1
+
+        # cache is invalidated on write/rm
+        u.write("abcdef")
+        assert u.size == 6
+        u.rm()
+        assert not u.exists
+    finally:
+        GCSURI.init_gcsuri(metadata_cache_ttl=0)
+
+
+def test_gcsuri_get_metadata_batch(gcs_v6_txt, v6_txt_size, v6_txt_md5_hash):
+    u_non_existing = GCSURI(gcs_v6_txt + ".should-not-be-here")
+
+    m = GCSURI.get_metadata_batch([gcs_v6_txt, u_non_existing.uri])
+    assert m[gcs_v6_txt].exists
+    assert m[gcs_v6_txt].md5 == v6_txt_md5_hash
+    assert m[gcs_v6_txt].size == v6_txt_size
+    assert m[gcs_v6_txt].mtime == GCSURI(gcs_v6_txt).mtime
+    assert not m[u_non_existing.uri].exists
+
+    m = GCSURI.get_metadata_batch([gcs_v6_txt], skip_md5=True)
+    assert m[gcs_v6_txt].md5 is None
+    assert m[gcs_v6_txt].size == v6_txt_size
+
+
+def test_gcsuri_prefetch_metadata():
+    """Metadata from a listing is cached and used by get_metadata()."""
+    bucket = Bucket(None, "test-bucket")
+    blobs = []
+    for name, md5_hash in (("d/a.txt", "1B2M2Y8AsgTpgAmY7PhCfg=="), ("d/b.txt", None)):
+        blob = Blob(name, bucket)
+        blob._properties.update(
+            {"size": "3", "updated": "2020-03-07T21:03:07.000Z", "md5Hash": md5_hash}
+        )
+        blobs.append(blob)
+    cl = MagicMock()
+    cl.list_blobs.return_value = blobs
+
+    GCSURI.init_gcsuri(metadata_cache_ttl=60)
+    try:
+        with patch.object(GCSURI, "get_gcs_client", return_value=cl):
+            m = GCSURI.prefetch_metadata("gs://test-bucket/d/")
+        # object without md5 hash is not prefetched
+        assert list(m) == ["gs://test-bucket/d/a.txt"]
+        m_a = m["gs://test-bucket/d/a.txt"]
+        assert m_a == URIMetadata(
+            exists=True,
+            mtime=1583614987.0,
+            size=3,
+            md5="d41d8cd98f00b204e9800998ecf8427e",
+        )
+        with patch.object(GCSURI, "get_blob") as get_blob:
+            assert GCSURI("gs://test-bucket/d/a.txt").get_metadata() is m_a
+            assert not get_blob.called
+    finally:
+        GCSURI.init_gcsuri(metadata_cache_ttl=0)
+
+
+def test_gcsuri_exists_batch(gcs_v6_txt):
+    u_non_existing = GCSURI(gcs_v6_txt + ".should-not-be-here")
+
+    e = GCSURI.exists_batch([gcs_v6_txt, u_non_existing.uri])
+    assert e == {gcs_v6_txt: True, u_non_existing.uri: False}
+
+
 def test_gcsuri_read(gcs_v6_txt):
     u = GCSURI(gcs_v6_txt)
     assert u.read() == v6_txt_contents()
     assert u.read(byte=True) == v6_txt_contents().encode()
 
 
+def test_gcsuri_open(gcs_v6_txt, gcs_test_path):
+    u = GCSURI(gcs_v6_txt)
+    with u.open() as fp:
+        assert fp.read() == v6_txt_contents().encode()
+    with u.open("r", chunk_size=256 * 1024) as fp:
+        assert fp.readline() == v6_txt_contents().splitlines(keepends=True)[0]
+
+    u_new = GCSURI(os.path.join(gcs_test_path, "test_gcsuri_open.txt"))
+    with u_new.open("w") as fp:
+        fp.write(v6_txt_contents())
+    assert u_new.read() == v6_txt_contents()
+    u_new.rm()
+
+
+def test_gcsuri_invalidate_cache_on_close():
+    u = GCSURI("gs://test-bucket/test_gcsuri_invalidate_cache_on_close.txt")
+    m = URIMetadata(
+        exists=True, mtime=0.0, size=0, md5="d41d8cd98f00b204e9800998ecf8427e"
+    )
+
+    GCSURI.init_gcsuri(metadata_cache_ttl=60)
+    try:
+        u._update_metadata_cache(m)
+        with patch.object(GCSURI, "get_blob", return_value=(MagicMock(), None)):
+            with u.open("wb"):
+                # contents are not uploaded until a writer is closed
+                assert u._get_metadata_from_cache() is m
+        assert u._get_metadata_from_cache() is None
+    finally:
+        GCSURI.init_gcsuri(metadata_cache_ttl=0)
+
+
+def test_gcsuri_read_with_metadata(gcs_v6_txt, v6_txt_size, v6_txt_md5_hash):
+    u = GCSURI(gcs_v6_txt)
+    s, m = u.read_with_metadata()
+    assert s == v6_txt_contents()
+    assert m.exists
+    assert m.md5 == v6_txt_md5_hash
+    assert m.size == v6_txt_size
+
+    b, m = u.read_with_metadata(byte=True, skip_md5=True)
+    assert b == v6_txt_contents().encode()
+    assert m.md5 is None
+    assert m.size == v6_txt_size
+
+
 def test_gcsuri_find_all_files(gcs_test_path):
     """Make a directory structure with empty files.
 
@@ -302,6 +433,85 @@ def test_gcsuri_rmdir(gcs_test_path):
         assert not GCSURI(file).exists
 
 
+def test_gcsuri_cp_parallel_upload(local_test_path, gcs_test_path):
+    """Upload a local file larger than threshold as 5 MiB chunks in parallel.
+    5 MiB is the minimum part size of XML API multipart upload.
+    """
+    u_local = AutoURI(os.path.join(local_test_path, "test_gcsuri_cp_parallel_upload"))
+    u_local.write(os.urandom(6 * 1024 * 1024))
+    u = GCSURI(os.path.join(gcs_test_path, "test_gcsuri_cp_parallel_upload"))
+
+    GCSURI.init_gcsuri(
+        parallel_upload_threshold=1, parallel_upload_chunk_size=5 * 1024 * 1024
+    )
+    try:
+        u_local.cp(u, no_checksum=True)
+    finally:
+        GCSURI.init_gcsuri(
+            parallel_upload_threshold=0, parallel_upload_chunk_size=32 * 1024 * 1024
+        )
+    assert u.size == u_local.size
+    assert u.read(byte=True) == u_local.read(byte=True)
+    u.rm()
+
+
+def test_gcsuri_cp_batch(gcs_v6_txt, local_v6_txt, gcs_test_path):
+    prefix = os.path.join(gcs_test_path, "test_gcsuri_cp_batch")
+    pairs = [
+        (gcs_v6_txt, os.path.join(prefix, "gcs", "v6.txt")),
+        (local_v6_txt, os.path.join(prefix, "local", "v6.txt")),
+    ]
+
+    dest_uris = GCSURI.cp_batch(pairs)
+    assert dest_uris == [dest_uri for _, dest_uri in pairs]
+    for dest_uri in dest_uris:
+        assert GCSURI(dest_uri).read() == v6_txt_contents()
+
+    GCSURI.rm_batch(dest_uris)
+
+
+def test_gcsuri_rm_batch(gcs_test_path):
+    prefix = os.path.join(gcs_test_path, "test_gcsuri_rm_batch")
+    all_files = make_files_in_dir(prefix, make_local_empty_dir_d_a=False)
+
+    GCSURI.rm_batch(all_files)
+    for file in all_files:
+        assert not GCSURI(file).exists
+
+
+def test_gcsuri_read_batch_while_resizing_executor(local_v6_txt):
+    """Replacing the shared thread pool must not break batches being submitted."""
+    max_concurrency = GCSURI.MAX_CONCURRENCY
+    errors = []
+
+    def read_batch():
+        try:
+            for _ in range(20):
+                GCSURI.read_batch([local_v6_txt] * 8)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=read_batch) for _ in range(4)]
+    try:
+        for t in threads:
+            t.start()
+        for i in range(20):
+            GCSURI.init_gcsuri(max_concurrency=2 + i % 3)
+        for t in threads:
+            t.join()
+    finally:
+        GCSURI.init_gcsuri(max_concurrency=max_concurrency)
+    assert not errors
+
+
+def test_gcsuri_read_batch(gcs_v6_txt, local_v6_txt):
+    contents = GCSURI.read_batch([gcs_v6_txt, local_v6_txt, gcs_v6_txt])
+    assert contents == [v6_txt_contents()] * 3
+
+    contents = GCSURI.read_batch([gcs_v6_txt], byte=True)
+    assert contents == [v6_txt_contents().encode()]
+
+
 # original methods in GCSURI
 def test_gcsuri_get_blob(gcs_v6_txt):
     u = GCSURI(gcs_v6_txt)
@@ -345,6 +555,24 @@ def test_gcsuri_get_presigned_url(gcs_v6_txt, gcp_private_key_file):
     # assert u_url.read() != v6_txt_contents()
 
 
+def test_gcsuri_get_presigned_url_cached():
+    """Cached URL is used until a half of its duration and then refreshed."""
+    u = GCSURI("gs://test-bucket/test_gcsuri_get_presigned_url_cached.txt")
+    blob = MagicMock()
+    blob.generate_signed_url.side_effect = ["url1", "url2", "url3"]
+    with patch.object(GCSURI, "get_blob", return_value=(blob, None)), patch.object(
+        GCSURI, "_get_credentials"
+    ):
+        assert u.get_presigned_url(duration=2) == "url1"
+        assert u.get_presigned_url(use_cached=True) == "url1"
+        assert u.get_presigned_url(duration=2, use_cached=True) == "url1"
+        # different duration
+        assert u.get_presigned_url(duration=4, use_cached=True) == "url2"
+        time.sleep(2.1)
+        assert u.get_presigned_url(use_cached=True) == "url3"
+    assert blob.generate_signed_url.call_count == 3
+
+
 def test_gcsuri_get_public_url(gcs_v6_txt):
     url = GCSURI(gcs_v6_txt).get_public_url()
     u_url = HTTPURL(url)
@@ -490,3 +718,110 @@ def test_gcsuri_localize(
         assert localized and AutoURI(expected).exists
         # check if all URIs defeind in localized JSON file exist
         recurse_raise_if_uri_not_exist(loc_uri)
+
+
+def mock_gcsurilock_acquire(lock, existing_blob):
+    """Run lock._acquire() on a mocked bucket whose get_blob() returns existing_blob.
+
+    Returns:
+        Mocked Blob.upload_from_string to check how lock file was written.
+    """
+    bucket_obj = MagicMock()
+    bucket_obj.get_blob.return_value = existing_blob
+    with patch.object(GCSURI, "_get_bucket", return_value=bucket_obj), patch(
+        "autouri.gcsuri.Blob"
+    ) as mocked_blob_cls, patch(
+        "autouri.gcsuri.now_utc", return_value=datetime.now(timezone.utc)
+    ):
+        lock._acquire()
+    return mocked_blob_cls.return_value.upload_from_string
+
+
+def test_gcsurilock_acquire_missing():
+    lock = GCSURILock("gs://test-bucket/test_gcsurilock_acquire.lock")
+    upload = mock_gcsurilock_acquire(lock, existing_blob=None)
+
+    upload.assert_called_once_with(str(id(lock)), if_generation_match=0)
+    assert lock._context.lock_file_fd == id(lock)
+    # not to release (remove) a mocked lock file on lock's __del__()
+    lock._context.lock_file_fd = None
+
+
+def test_gcsurilock_acquire_expired():
+    lock = GCSURILock("gs://test-bucket/test_gcsurilock_acquire.lock")
+    blob = MagicMock()
+    blob.generation = 1234
+    blob.updated = datetime.now(timezone.utc) - timedelta(
+        seconds=GCSURILock.LOCK_FILE_EXPIRATION_SEC + 60
+    )
+    blob.metadata = {GCSURILock.LOCK_OWNER_METADATA_KEY: "another-owner"}
+    upload = mock_gcsurilock_acquire(lock, existing_blob=blob)
+
+    upload.assert_called_once_with(str(id(lock)), if_generation_match=1234)
+    assert lock._context.lock_file_fd == id(lock)
+    lock._context.lock_file_fd = None
+
+
+def test_gcsurilock_acquire_owned():
+    lock = GCSURILock("gs://test-bucket/test_gcsurilock_acquire.lock")
+    blob = MagicMock()
+    blob.updated = datetime.now(timezone.utc)
+
+    # owned by another lock: not acquired
+    blob.metadata = {GCSURILock.LOCK_OWNER_METADATA_KEY: "another-owner"}
+    upload = mock_gcsurilock_acquire(lock, existing_blob=blob)
+    upload.assert_not_called()
+    assert lock._context.lock_file_fd is None
+
+    # owned by self: acquired without writing a lock file
+    blob.metadata = {GCSURILock.LOCK_OWNER_METADATA_KEY: str(id(lock))}
+    upload = mock_gcsurilock_acquire(lock, existing_blob=blob)
+    upload.assert_not_called()
+    assert lock._context.lock_file_fd == id(lock)
+    lock._context.lock_file_fd = None
+
+
+def test_gcsuri_thread_id_propagation():
+    u = GCSURI("gs://test-bucket/test_gcsuri_thread_id.txt", thread_id=3)
+    assert u.md5_file_uri.thread_id == 3
+    assert u.get_lock(no_lock=False)._thread_id == 3
+
+
+class NonSeekableBody(io.RawIOBase):
+    """Body of S3's get_object() which cannot seek/tell."""
+
+    def __init__(self, data):
+        self._fp = io.BytesIO(data)
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        return self._fp.readinto(b)
+
+
+def test_gcsuri_cp_from_s3_stream():
+    """S3 object's non-seekable body is streamed to a BlobWriter."""
+    data = b"s3 to gcs stream"
+    u = GCSURI("gs://test-bucket/test_gcsuri_cp_from_s3_stream.txt")
+    blob = MagicMock()
+    fp = io.BytesIO()
+    blob.open.return_value.__enter__.return_value = fp
+
+    cl = S3URI.get_boto3_client()
+    with Stubber(cl) as stubber, patch.object(
+        GCSURI, "get_blob", return_value=(blob, None)
+    ):
+        stubber.add_response(
+            "get_object",
+            {
+                "Body": StreamingBody(NonSeekableBody(data), len(data)),
+                "ContentLength": len(data),
+            },
+            {"Bucket": "test-bucket", "Key": "test_gcsuri_cp_from_s3_stream.txt"},
+        )
+        assert u._cp_from(S3URI("s3://test-bucket/test_gcsuri_cp_from_s3_stream.txt"))
+
+    blob.open.assert_called_once_with("wb")
+    blob.upload_from_file.assert_not_called()
+    assert fp.getvalue() == data
@@ -275,6 +275,25 @@ def test_httpurl_rmdir(url_test_path):
 
 
 # original methods in HTTPURL
+def test_httpurl_get_session():
+    session = HTTPURL.get_session(thread_id=1)
+    assert HTTPURL.get_session(thread_id=1) is session
+    assert HTTPURL.get_session(thread_id=2) is not session
+
+    adapter = session.get_adapter("https://")
+    assert adapter.max_retries.total == HTTPURL.HTTP_MAX_RETRIES
+    assert session.get_adapter("http://") is adapter
+
+    # sessions are re-created with new settings
+    HTTPURL.init_httpurl(http_max_retries=1)
+    try:
+        assert HTTPURL.get_session(thread_id=1) is not session
+        assert (
+            HTTPURL.get_session(thread_id=1).get_adapter("https://").max_retries.total
+            == 1
+        )
+    finally:
+        HTTPURL.init_httpurl(http_max_retries=5)
 
 
 # classmethods
@@ -1,6 +1,11 @@
 from binascii import hexlify
 
-from autouri.metadata import base64_to_hex, get_seconds_from_epoch, parse_md5_str
+from autouri.metadata import (
+    base64_to_hex,
+    get_seconds_from_epoch,
+    get_seconds_from_http_date,
+    parse_md5_str,
+)
 
 
 def test_get_seconds_from_epoch():
@@ -10,6 +15,13 @@ def test_get_seconds_from_epoch():
     assert get_seconds_from_epoch("2017-03-10 14:30:12,655+0000") == 1489156212.655
 
 
+def test_get_seconds_from_http_date():
+    assert get_seconds_from_http_date("Sat, 07 Mar 2020 21:03:07 GMT") == 1583614987.0
+    assert get_seconds_from_http_date("Sat, 07 Mar 2020 21:03:07 -0000") == 1583614987.0
+    # non-standard format
+    assert get_seconds_from_http_date("2017-07-01T14:59:55.711Z") == 1498921195.711
+
+
 def test_base64_to_hex():
     assert base64_to_hex("aGVsbG8gd29ybGQ=") == hexlify("hello world".encode()).decode()
     assert (
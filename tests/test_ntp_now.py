@@ -1,11 +1,24 @@
-"""Make sure to run these tests on a machine with correct os time
+"""NTP server is mocked to respond with a correct time
+so these tests don't need network access.
 """
+import time
 from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
 from unittest.mock import patch
 
-from autouri.ntp_now import get_cached_offset, now_utc, reset_cached_offset
+from autouri.ntp_now import (
+    get_cached_offset,
+    now_utc,
+    reset_cached_offset,
+    set_cached_offset,
+)
 
 
+def mocked_ntp_request(self, host, *args, **kwargs):
+    return SimpleNamespace(tx_time=time.time(), delay=0.0)
+
+
+@patch("ntplib.NTPClient.request", mocked_ntp_request)
 def test_now_utc():
     reset_cached_offset()
 
@@ -18,6 +31,7 @@ class MockedDataTime(datetime):
         return datetime.now(timezone) - timedelta(0, 25)
 
 
+@patch("ntplib.NTPClient.request", mocked_ntp_request)
 def test_now_utc_wrong_os_time():
     reset_cached_offset()
     with patch("autouri.ntp_now.datetime", MockedDataTime):
@@ -29,3 +43,16 @@ def test_now_utc_wrong_os_time():
     # cache offset should be 25 second
     cached_offset_in_seconds = get_cached_offset().total_seconds()
     assert cached_offset_in_seconds > 24.95 and cached_offset_in_seconds < 25.05
+
+
+def test_now_utc_cached_offset():
+    """NTP server is not requested once offset is cached."""
+    set_cached_offset(timedelta(seconds=25))
+    try:
+        with patch("autouri.ntp_now.datetime", MockedDataTime), patch(
+            "ntplib.NTPClient.request", side_effect=AssertionError
+        ):
+            ntp_now_utc = now_utc()
+        assert abs((ntp_now_utc - datetime.now(timezone.utc)).total_seconds()) < 0.05
+    finally:
+        reset_cached_offset()
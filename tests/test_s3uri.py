@@ -1,13 +1,17 @@
 import os
 import time
+from datetime import datetime, timezone
 from typing import Any, Tuple
 
 import pytest
+from botocore.exceptions import ClientError
+from botocore.stub import ANY, Stubber
 from requests.exceptions import HTTPError
 
 from autouri.autouri import AutoURI, URIBase
 from autouri.httpurl import HTTPURL, ReadOnlyStorageError
-from autouri.s3uri import S3URI
+from autouri.metadata import URIMetadata
+from autouri.s3uri import S3URI, S3URILock
 
 from .files import (
     common_paths,
@@ -262,6 +266,156 @@ def test_s3uri_get_metadata(s3_v6_txt, v6_txt_size, v6_txt_md5_hash):
     assert not u_md5.exists
 
 
+def test_s3uri_head_object_fields():
+    """Metadata is taken from fields parsed by boto3."""
+    cl = S3URI.get_boto3_client()
+    with Stubber(cl) as stubber:
+        stubber.add_response(
+            "head_object",
+            {
+                "ContentLength": 3,
+                "LastModified": datetime(2020, 3, 7, 21, 3, 7, tzinfo=timezone.utc),
+                "ETag": '"d41d8cd98f00b204e9800998ecf8427e"',
+            },
+            {"Bucket": "test-bucket", "Key": "a.txt"},
+        )
+        m = S3URI("s3://test-bucket/a.txt").get_metadata()
+    assert m == URIMetadata(
+        exists=True,
+        mtime=1583614987.0,
+        size=3,
+        md5="d41d8cd98f00b204e9800998ecf8427e",
+    )
+
+
+def test_s3uri_head_object_cache():
+    """head_object is not called again for cached metadata."""
+    u = S3URI("s3://test-bucket/test_s3uri_head_object_cache.txt")
+    cl = S3URI.get_boto3_client()
+    URIBase.init_uribase(metadata_cache_ttl=60)
+    try:
+        with Stubber(cl) as stubber:
+            stubber.add_response(
+                "head_object",
+                {"ContentLength": 3},
+                {"Bucket": "test-bucket", "Key": "test_s3uri_head_object_cache.txt"},
+            )
+            m = u.get_metadata(skip_md5=True)
+            assert m.exists and m.size == 3
+            assert u.get_metadata(skip_md5=True) is m
+            stubber.assert_no_pending_responses()
+
+            u.invalidate_metadata_cache()
+            stubber.add_client_error("head_object", http_status_code=404)
+            assert not u.get_metadata(skip_md5=True).exists
+    finally:
+        URIBase.init_uribase(metadata_cache_ttl=0)
+
+
+def test_s3uri_head_object_error():
+    """403 and 404 mean that an object does not exist.
+    S3 returns 403 for a missing key without s3:ListBucket permission.
+    Other errors are raised.
+    """
+    u = S3URI("s3://test-bucket/test_s3uri_head_object_error.txt")
+    cl = S3URI.get_boto3_client()
+    with Stubber(cl) as stubber:
+        stubber.add_client_error("head_object", http_status_code=404)
+        assert not u.exists
+
+        stubber.add_client_error("head_object", http_status_code=403)
+        assert not u.exists
+
+        stubber.add_client_error("head_object", http_status_code=400)
+        with pytest.raises(ClientError):
+            u.get_metadata(skip_md5=True)
+
+
+def test_s3uri_prefetch_metadata():
+    """Metadata from a listing is cached and used by get_metadata()."""
+    cl = S3URI.get_boto3_client()
+    mt = datetime(2020, 3, 7, 21, 3, 7, tzinfo=timezone.utc)
+    URIBase.init_uribase(metadata_cache_ttl=60)
+    try:
+        with Stubber(cl) as stubber:
+            stubber.add_response(
+                "list_objects_v2",
+                {
+                    "Contents": [
+                        {
+                            "Key": "d/a.txt",
+                            "ETag": '"d41d8cd98f00b204e9800998ecf8427e"',
+                            "Size": 3,
+                            "LastModified": mt,
+                        },
+                        {
+                            "Key": "d/b.txt",
+                            "ETag": '"d41d8cd98f00b204e9800998ecf8427e-2"',
+                            "Size": 3,
+                            "LastModified": mt,
+                        },
+                    ]
+                },
+                {"Bucket": "test-bucket", "Prefix": "d/"},
+            )
+            m = S3URI.prefetch_metadata("s3://test-bucket/d/")
+            # multipart uploaded object (ETag is not md5) is not prefetched
+            assert list(m) == ["s3://test-bucket/d/a.txt"]
+            m_a = m["s3://test-bucket/d/a.txt"]
+            assert m_a == URIMetadata(
+                exists=True,
+                mtime=1583614987.0,
+                size=3,
+                md5="d41d8cd98f00b204e9800998ecf8427e",
+            )
+            assert S3URI("s3://test-bucket/d/a.txt").get_metadata() is m_a
+    finally:
+        URIBase.init_uribase(metadata_cache_ttl=0)
+
+
+def test_s3urilock_conditional_put():
+    """Lock is acquired with a single conditional put_object
+    and an expired lock file is deleted only if its ETag is matched.
+    """
+    cl = S3URI.get_boto3_client()
+    lock = S3URILock("s3://test-bucket/a.txt.lock")
+    params = {"Bucket": "test-bucket", "Key": "a.txt.lock"}
+    put_params = dict(params, Body=ANY, IfNoneMatch="*")
+    with Stubber(cl) as stubber:
+        stubber.add_response("put_object", {}, put_params)
+        lock._acquire()
+        assert lock.is_locked
+        stubber.assert_no_pending_responses()
+        lock._context.lock_file_fd = None
+
+        # lock file exists and is not expired
+        stubber.add_client_error(
+            "put_object", "PreconditionFailed", http_status_code=412
+        )
+        stubber.add_response(
+            "head_object", {"LastModified": datetime.now(timezone.utc), "ETag": '"a"'}
+        )
+        lock._acquire()
+        assert not lock.is_locked
+        stubber.assert_no_pending_responses()
+
+        # lock file exists and is expired
+        stubber.add_client_error(
+            "put_object", "PreconditionFailed", http_status_code=412
+        )
+        stubber.add_response(
+            "head_object",
+            {
+                "LastModified": datetime(2020, 3, 7, 21, 3, 7, tzinfo=timezone.utc),
+                "ETag": '"b"',
+            },
+        )
+        stubber.add_response("delete_object", {}, dict(params, IfMatch='"b"'))
+        lock._acquire()
+        assert not lock.is_locked
+        stubber.assert_no_pending_responses()
+
+
 def test_s3uri_read(s3_v6_txt):
     u = S3URI(s3_v6_txt)
     assert u.read() == v6_txt_contents()